@@ -3,6 +3,7 @@
 СКОПИРОВАНО ИЗ ОРИГИНАЛЬНОГО СКРИПТА БЕЗ ИЗМЕНЕНИЙ
 """
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Tuple, Dict, Any
 from app.core.video_processor import BaseVideoProcessor
@@ -54,12 +55,14 @@ class MultiShortsAlgorithm(BaseVideoProcessor):
         """
         Находит все видеофайлы в папке
         
-        СКОПИРОВАНО ИЗ ОРИГИНАЛЬНОГО СКРИПТА БЕЗ ИЗМЕНЕНИЙ
+        rglob по каждому расширению вместо rglob('*') с фильтром в
+        Python: посторонние файлы отсеиваются еще на уровне обхода
+        каталога.
         """
-        video_files = []
-        for file_path in input_folder.rglob('*'):
-            if file_path.suffix.lower() in self.video_extensions:
-                video_files.append(file_path)
+        video_files = set()
+        for ext in self.video_extensions:
+            video_files.update(input_folder.rglob(f'*{ext}'))
+            video_files.update(input_folder.rglob(f'*{ext.upper()}'))
         return sorted(video_files)
     
     def check_ffmpeg(self) -> bool:
@@ -117,47 +120,30 @@ class MultiShortsAlgorithm(BaseVideoProcessor):
         successful_segments = 0
         result_files = []
         
-        # Обрабатываем каждый сегмент
-        for i, (start, end) in enumerate(segments, 1):
-            duration = end - start
-            segment_name = f"{video_path.stem}_part_{i:02d}_({duration:.0f}s).mp4"
-            temp_segment_path = video_output_folder / f"temp_{segment_name}"
-            final_segment_path = video_output_folder / segment_name
-            
-            print(f"    Сегмент {i}/{len(segments)}: {start:.1f}s - {end:.1f}s ({duration:.1f}s)")
-            
-            # Извлекаем сегмент
-            if self.segment_extractor.extract_segment(video_path, start, end, temp_segment_path):
-                print(f"    Видео сегмент извлечен")
-                
-                if temp_segment_path.exists():
-                    # Генерируем субтитры если включены (пока отключено)
-                    srt_content = ""
-                    if self.enable_subtitles:
-                        print(f"    Генерируем субтитры...")
-                        srt_content = self.subtitle_engine.generate_subtitles(temp_segment_path)
-                    
-                    # Создаем мобильную версию
-                    print(f"    Создаем мобильную версию...")
-                    
-                    if self.mobile_converter.convert_to_mobile_format(temp_segment_path, final_segment_path):
-                        print(f"    {segment_name} готов (мобильная версия)!")
-                        successful_segments += 1
-                        result_files.append(str(final_segment_path))
-                    else:
-                        # Если мобильная версия не создалась, оставляем оригинальную
-                        temp_segment_path.rename(final_segment_path)
-                        print(f"    {segment_name} готов (оригинальная версия)")
-                        successful_segments += 1
-                        result_files.append(str(final_segment_path))
-                    
-                    # Удаляем временный файл
-                    if temp_segment_path.exists():
-                        temp_segment_path.unlink()
-                else:
-                    print(f"    Временный файл сегмента не найден")
-            else:
-                print(f"    Не удалось создать сегмент {i}")
+        # Аудио для Whisper декодируем один раз на исходник -
+        # сегментам достаются срезы массива по их времени. Без
+        # загруженной модели декодировать нечего: generate_subtitles
+        # сразу вернет пустую строку
+        source_audio = None
+        if self.enable_subtitles and self.subtitle_engine.whisper_model:
+            source_audio = self.subtitle_engine.load_full_audio(video_path)
+        
+        # Обрабатываем сегменты параллельно: каждый - независимая цепочка
+        # вызовов FFmpeg, GIL на subprocess не влияет, поэтому хватает
+        # пула потоков. Ядра делим между одновременными процессами FFmpeg
+        max_workers = min(4, len(segments))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._process_segment, i, len(segments),
+                                video_path, start, end, video_output_folder,
+                                self._audio_slice(source_audio, start, end))
+                for i, (start, end) in enumerate(segments, 1)
+            ]
+            for future in futures:
+                final_path = future.result()
+                if final_path is not None:
+                    successful_segments += 1
+                    result_files.append(final_path)
         
         print(f"  Успешно создано сегментов: {successful_segments}/{len(segments)}")
         
@@ -169,6 +155,112 @@ class MultiShortsAlgorithm(BaseVideoProcessor):
             'output_folder': str(video_output_folder)
         }
     
+    def _mostly_silent(self, start: float, end: float, threshold: float = 0.8) -> bool:
+        """
+        Проверяет, занята ли тишиной большая часть сегмента
+        
+        Интервалы тишины уже найдены анализатором при поиске точек
+        нарезки - запуск Whisper на таком сегменте не даст реплик.
+        
+        Args:
+            start: Начало сегмента в секундах
+            end: Конец сегмента в секундах
+            threshold: Доля тишины, с которой сегмент считается немым
+            
+        Returns:
+            bool: True если тишина покрывает больше threshold сегмента
+        """
+        duration = end - start
+        if duration <= 0:
+            return False
+        
+        silent = 0.0
+        for s_start, s_end in self.content_analyzer.last_silence_intervals:
+            overlap = min(end, s_end) - max(start, s_start)
+            if overlap > 0:
+                silent += overlap
+        
+        return silent / duration > threshold
+    
+    @staticmethod
+    def _audio_slice(source_audio, start: float, end: float):
+        """Возвращает срез заранее декодированного аудио для сегмента"""
+        if source_audio is None:
+            return None
+        from app.core.subtitle_engine import AUDIO_SAMPLE_RATE
+        return source_audio[int(start * AUDIO_SAMPLE_RATE):int(end * AUDIO_SAMPLE_RATE)]
+    
+    def _process_segment(self, i: int, total: int, video_path: Path,
+                         start: float, end: float, video_output_folder: Path,
+                         audio_slice=None) -> Any:
+        """
+        Доводит один сегмент до готового шортса
+        
+        Args:
+            i: Номер сегмента (с единицы)
+            total: Общее число сегментов
+            video_path: Путь к исходному видео
+            start: Начальное время в секундах
+            end: Конечное время в секундах
+            video_output_folder: Папка результатов этого видео
+            
+        Returns:
+            str или None: Путь к готовому файлу либо None при ошибке
+        """
+        duration = end - start
+        segment_name = f"{video_path.stem}_part_{i:02d}_({duration:.0f}s).mp4"
+        temp_segment_path = video_output_folder / f"temp_{segment_name}"
+        final_segment_path = video_output_folder / segment_name
+        
+        print(f"    Сегмент {i}/{total}: {start:.1f}s - {end:.1f}s ({duration:.1f}s)")
+        
+        # Без субтитров сегмент можно вырезать и конвертировать одним
+        # запуском FFmpeg - без temp-файла и повторного декодирования.
+        # Субтитрам пока нужен извлеченный сегмент, им оставляем два шага
+        if not self.enable_subtitles:
+            if self.mobile_converter.convert_segment_to_mobile(video_path, start, end, final_segment_path):
+                print(f"    {segment_name} готов (мобильная версия)!")
+                return str(final_segment_path)
+            print(f"    Слитный проход не удался, пробуем по шагам...")
+        
+        # Извлекаем сегмент
+        if not self.segment_extractor.extract_segment(video_path, start, end, temp_segment_path):
+            print(f"    Не удалось создать сегмент {i}")
+            return None
+        
+        print(f"    Видео сегмент извлечен")
+        
+        if not temp_segment_path.exists():
+            print(f"    Временный файл сегмента не найден")
+            return None
+        
+        # Генерируем субтитры если включены (пока отключено):
+        # Whisper получает готовый срез аудио вместо повторного декода.
+        # Почти немые сегменты не транскрибируем вовсе
+        srt_content = ""
+        if self.enable_subtitles:
+            if self._mostly_silent(start, end):
+                print(f"    Сегмент почти целиком тишина - пропускаем Whisper")
+            else:
+                print(f"    Генерируем субтитры...")
+                srt_content = self.subtitle_engine.generate_subtitles(temp_segment_path, audio=audio_slice)
+        
+        # Создаем мобильную версию
+        print(f"    Создаем мобильную версию...")
+        
+        if self.mobile_converter.convert_to_mobile_format(temp_segment_path, final_segment_path):
+            print(f"    {segment_name} готов (мобильная версия)!")
+        else:
+            # Если мобильная версия не создалась, оставляем оригинальную
+            temp_segment_path.rename(final_segment_path)
+            print(f"    {segment_name} готов (оригинальная версия)")
+        
+        # Удаляем временный файл
+        if temp_segment_path.exists():
+            temp_segment_path.unlink()
+        
+        return str(final_segment_path)
+    
     def process_multiple_videos(self, input_folder: Path, output_folder: Path) -> Dict[str, Any]:
         """
         Обрабатывает все видео в папке (как в оригинальном скрипте)
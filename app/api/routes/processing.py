@@ -1,6 +1,7 @@
 """
 API роуты для обработки видео
 """
+import json
 import time
 import aiofiles
 from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends, Form
@@ -9,9 +10,10 @@ from pathlib import Path
 from typing import Optional
 
 from app.models.schemas import (
-    ProcessingRequest, 
-    ProcessingResponse, 
-    TaskStatusResponse, 
+    ProcessingRequest,
+    LocalProcessingRequest,
+    ProcessingResponse,
+    TaskStatusResponse,
     ErrorResponse,
     TaskStatus
 )
@@ -57,11 +59,12 @@ async def process_video(
     min_duration: int = Form(60),
     max_duration: int = Form(180), 
     enable_subtitles: bool = Form(False),
-    mobile_scale_factor: float = Form(1.2)
+    mobile_scale_factor: float = Form(1.2),
+    meta: Optional[str] = Form(None)
 ):
     """
     Загружает видео и запускает обработку
-    
+
     Args:
         background_tasks: Фоновые задачи FastAPI
         file: Загруженный видеофайл
@@ -70,14 +73,29 @@ async def process_video(
         max_duration: Максимальная длительность сегмента в секундах
         enable_subtitles: Включить генерацию субтитров
         mobile_scale_factor: Коэффициент увеличения основного видео
-        
+        meta: Альтернатива отдельным полям - все параметры одним JSON
+
     Returns:
         ProcessingResponse: Ответ с ID задачи и статусом
     """
     try:
         # Валидируем файл
         validate_file(file)
-        
+
+        # Бот передает параметры одним JSON-полем 'meta' -
+        # одна multipart-часть вместо пяти
+        if meta:
+            try:
+                meta_params = json.loads(meta)
+            except json.JSONDecodeError:
+                raise HTTPException(status_code=400, detail="Поле 'meta' содержит невалидный JSON")
+
+            algorithm = meta_params.get('algorithm', algorithm)
+            min_duration = int(meta_params.get('min_duration', min_duration))
+            max_duration = int(meta_params.get('max_duration', max_duration))
+            enable_subtitles = str(meta_params.get('enable_subtitles', enable_subtitles)).lower() in ('1', 'true', 'yes')
+            mobile_scale_factor = float(meta_params.get('mobile_scale_factor', mobile_scale_factor))
+
         # Создаем параметры запроса
         request_params = ProcessingRequest(
             algorithm=algorithm,
@@ -127,6 +145,86 @@ async def process_video(
         )
 
 
+@router.post("/process/local", response_model=ProcessingResponse)
+async def process_video_local(
+    background_tasks: BackgroundTasks,
+    request: LocalProcessingRequest
+):
+    """
+    Запускает обработку файла, уже лежащего на общем диске
+
+    Бот и API монтируют один и тот же ./storage, поэтому вместо второй
+    полной передачи файла по loopback бот присылает только путь.
+
+    Args:
+        background_tasks: Фоновые задачи FastAPI
+        request: Параметры обработки + путь к файлу в общем хранилище
+
+    Returns:
+        ProcessingResponse: Ответ с ID задачи и статусом
+    """
+    try:
+        video_path = Path(request.file_path)
+
+        # Путь обязан находиться внутри общего хранилища (безопасность)
+        storage_root = settings.temp_path_obj.resolve().parent
+        try:
+            video_path.resolve().relative_to(storage_root)
+        except ValueError:
+            raise HTTPException(
+                status_code=403,
+                detail="Доступ к файлу запрещен"
+            )
+
+        if not video_path.exists() or not video_path.is_file():
+            raise HTTPException(
+                status_code=404,
+                detail=f"Файл не найден: {request.file_path}"
+            )
+
+        if video_path.suffix.lower() not in settings.allowed_extensions:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неподдерживаемый формат файла: {video_path.suffix.lower()}"
+            )
+
+        if video_path.stat().st_size > settings.max_file_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Файл слишком большой. Максимальный размер: {settings.max_file_size / 1024 / 1024:.0f} MB"
+            )
+
+        # Создаем задачу прямо на существующем файле - без копирования
+        task_id = video_service.create_processing_task(
+            filename=video_path.name,
+            file_path=video_path,
+            request_params=request,
+            ip_address=None,
+            user_agent=None
+        )
+
+        background_tasks.add_task(
+            video_service.start_processing,
+            task_id,
+            video_path,
+            request
+        )
+
+        return ProcessingResponse(
+            task_id=task_id,
+            status=TaskStatus.QUEUED,
+            message="Задача добавлена в очередь на обработку"
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Внутренняя ошибка сервера: {str(e)}"
+        )
+
+
 @router.get("/status/{task_id}", response_model=TaskStatusResponse)
 async def get_task_status(task_id: str):
     """
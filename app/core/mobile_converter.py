@@ -5,6 +5,8 @@
 import subprocess
 from pathlib import Path
 
+from app.core.video_processor import FFMPEG_BASE
+
 try:
     from moviepy.video.io.VideoFileClip import VideoFileClip
 except ImportError:
@@ -23,12 +25,113 @@ class MobileConverter:
         """
         self.mobile_scale_factor = mobile_scale_factor
     
+    def _build_mobile_filter(self, original_width: int, original_height: int) -> str:
+        """
+        Строит filter_complex для мобильного формата 9:16
+        
+        Args:
+            original_width: Ширина исходного видео
+            original_height: Высота исходного видео
+            
+        Returns:
+            str: Строка фильтра FFmpeg
+        """
+        # Целевое разрешение для мобильного (9:16)
+        target_width = 1080
+        target_height = 1920
+        
+        # СТРАТЕГИЯ: Основное видео по центру + размытый фон
+        # 1. Масштабируем основное видео чуть больше чем по ширине для лучшей видимости
+        main_scale_width = int(target_width * self.mobile_scale_factor)  # Увеличиваем на mobile_scale_factor
+        main_scale_height = int(original_height * (main_scale_width / original_width))
+        
+        # 2. Позиция основного видео по центру экрана
+        main_x = (target_width - main_scale_width) // 2  # Будет отрицательное - это нормально
+        main_y = (target_height - main_scale_height) // 2
+        
+        # 3. Для фона: увеличиваем и размываем исходное видео
+        # Масштабируем фон чтобы заполнил всю высоту (будет шире чем нужно, но нам так и надо)
+        bg_scale_height = target_height
+        bg_scale_width = int(original_width * (target_height / original_height))
+        
+        # Центрируем фон по горизонтали
+        bg_x = (target_width - bg_scale_width) // 2
+        
+        print(f"     Основное видео: {main_scale_width}x{main_scale_height} в позиции ({main_x}, {main_y})")
+        print(f"     Размытый фон: {bg_scale_width}x{bg_scale_height} в позиции ({bg_x}, 0)")
+        
+        # Создаем сложный фильтр:
+        # [0:v] - исходное видео
+        # Делаем фон: масштабируем на всю высоту, размываем, центрируем
+        # Делаем основное: масштабируем больше чем экран для лучшей видимости, накладываем поверх фона
+        return (
+            f"[0:v]scale={bg_scale_width}:{bg_scale_height},boxblur=15:3,crop={target_width}:{target_height}:{abs(bg_x) if bg_x < 0 else 0}:0[bg];"
+            f"[0:v]scale={main_scale_width}:{main_scale_height}[main];"
+            f"[bg][main]overlay={main_x}:{main_y}"
+        )
+    
+    def convert_segment_to_mobile(self, video_path: Path, start_time: float,
+                                  end_time: float, output_path: Path) -> bool:
+        """
+        Вырезает сегмент и конвертирует его в мобильный формат ОДНИМ запуском
+        
+        Двухшаговый путь пишет temp-сегмент на диск и тут же читает его
+        обратно для конвертации - лишняя полная запись и лишнее
+        декодирование. Здесь -ss/-t применяются прямо к исходнику, а
+        filter_complex делает мобильную раскладку в том же процессе.
+        
+        Args:
+            video_path: Путь к ИСХОДНОМУ видео
+            start_time: Начальное время сегмента в секундах
+            end_time: Конечное время сегмента в секундах
+            output_path: Путь для сохранения результата
+            
+        Returns:
+            bool: True если успешно, False если ошибка
+        """
+        try:
+            # Размеры сегмента совпадают с размерами исходника
+            with VideoFileClip(str(video_path)) as clip:
+                original_width = clip.w
+                original_height = clip.h
+            
+            print(f"     Конвертируем сегмент в мобильный формат (слитный проход)...")
+            filter_str = self._build_mobile_filter(original_width, original_height)
+            
+            cmd = FFMPEG_BASE + [
+                '-loglevel', 'error',
+                '-ss', str(start_time),
+                '-i', str(video_path.absolute()),
+                '-t', str(end_time - start_time),
+                '-filter_complex', filter_str,
+                '-c:a', 'copy',
+                '-y',
+                str(output_path.absolute())
+            ]
+            
+            # stdout не нужен; stderr читаем - из него печатаются ошибки
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE, text=True)
+            
+            if result.returncode == 0:
+                print(f"     Мобильная версия создана с размытым фоном!")
+                return True
+            
+            print(f"     Ошибка слитной конвертации сегмента:")
+            if result.stderr:
+                error_lines = result.stderr.strip().split('\n')[-2:]
+                for line in error_lines:
+                    if line.strip():
+                        print(f"     {line}")
+            return False
+        except Exception as e:
+            print(f"     Ошибка при слитной конвертации сегмента: {e}")
+            return False
+    
     def convert_to_mobile_format(self, input_path: Path, output_path: Path) -> bool:
         """
         Конвертирует видео в мобильный формат 9:16 с размытым фоном
         
-        СКОПИРОВАНО ИЗ ОРИГИНАЛЬНОГО СКРИПТА БЕЗ ИЗМЕНЕНИЙ
-        
         Args:
             input_path: Путь к исходному видео
             output_path: Путь для сохранения результата
@@ -46,45 +149,13 @@ class MobileConverter:
             print(f"     Конвертируем в мобильный формат...")
             print(f"     Исходное разрешение: {original_width}x{original_height} ({original_ratio:.2f}:1)")
             
-            # Целевое разрешение для мобильного (9:16)
-            target_width = 1080
-            target_height = 1920
-            
-            # СТРАТЕГИЯ: Основное видео по центру + размытый фон
-            # 1. Масштабируем основное видео чуть больше чем по ширине для лучшей видимости
-            main_scale_width = int(target_width * self.mobile_scale_factor)  # Увеличиваем на mobile_scale_factor
-            main_scale_height = int(original_height * (main_scale_width / original_width))
-            
-            # 2. Позиция основного видео по центру экрана
-            main_x = (target_width - main_scale_width) // 2  # Будет отрицательное - это нормально
-            main_y = (target_height - main_scale_height) // 2
-            
-            # 3. Для фона: увеличиваем и размываем исходное видео
-            # Масштабируем фон чтобы заполнил всю высоту (будет шире чем нужно, но нам так и надо)
-            bg_scale_height = target_height
-            bg_scale_width = int(original_width * (target_height / original_height))
-            
-            # Центрируем фон по горизонтали
-            bg_x = (target_width - bg_scale_width) // 2
-            
-            print(f"     Основное видео: {main_scale_width}x{main_scale_height} в позиции ({main_x}, {main_y})")
-            print(f"     Размытый фон: {bg_scale_width}x{bg_scale_height} в позиции ({bg_x}, 0)")
-            
-            # Создаем сложный фильтр:
-            # [0:v] - исходное видео
-            # Делаем фон: масштабируем на всю высоту, размываем, центрируем
-            # Делаем основное: масштабируем больше чем экран для лучшей видимости, накладываем поверх фона
-            filter_str = (
-                f"[0:v]scale={bg_scale_width}:{bg_scale_height},boxblur=15:3,crop={target_width}:{target_height}:{abs(bg_x) if bg_x < 0 else 0}:0[bg];"
-                f"[0:v]scale={main_scale_width}:{main_scale_height}[main];"
-                f"[bg][main]overlay={main_x}:{main_y}"
-            )
+            filter_str = self._build_mobile_filter(original_width, original_height)
             
             print(f"     Применяем фильтр размытого фона...")
             
             # Выполняем конвертацию
-            cmd = [
-                'ffmpeg',
+            cmd = FFMPEG_BASE + [
+                '-loglevel', 'error',
                 '-i', str(input_path.absolute()),
                 '-filter_complex', filter_str,
                 '-c:a', 'copy',
@@ -92,7 +163,9 @@ class MobileConverter:
                 str(output_path.absolute())
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # stdout не нужен; stderr читаем - из него печатаются ошибки
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE, text=True)
             
             if result.returncode == 0:
                 print(f"     Мобильная версия создана с размытым фоном!")
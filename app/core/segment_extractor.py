@@ -5,6 +5,8 @@
 import subprocess
 from pathlib import Path
 
+from app.core.video_processor import FFMPEG_BASE
+
 
 class SegmentExtractor:
     """Класс для извлечения сегментов видео"""
@@ -13,34 +15,57 @@ class SegmentExtractor:
         """Инициализация извлекателя"""
         pass
     
-    def extract_segment(self, video_path: Path, start_time: float, end_time: float, output_path: Path) -> bool:
+    def extract_segment(self, video_path: Path, start_time: float, end_time: float,
+                        output_path: Path, accurate: bool = False) -> bool:
         """
         Извлекает сегмент видео
         
-        СКОПИРОВАНО ИЗ ОРИГИНАЛЬНОГО СКРИПТА БЕЗ ИЗМЕНЕНИЙ
+        -ss ПЕРЕД -i - быстрый поиск по контейнеру: FFmpeg прыгает к
+        ближайшему ключевому кадру вместо декодирования всего файла от
+        нуля до точки разреза. Для поздних сегментов длинного видео это
+        на порядки быстрее; при -c copy точность та же, потому что копия
+        в любом случае начинается с ключевого кадра.
         
         Args:
             video_path: Путь к исходному видео
             start_time: Начальное время в секундах
             end_time: Конечное время в секундах
             output_path: Путь для сохранения сегмента
+            accurate: Точный (медленный) поиск со старым порядком -ss
             
         Returns:
             bool: True если успешно, False если ошибка
         """
-        cmd = [
-            'ffmpeg',
-            '-i', str(video_path),
-            '-ss', str(start_time),
-            '-t', str(end_time - start_time),
-            '-c', 'copy',
-            '-avoid_negative_ts', 'make_zero',
-            str(output_path),
-            '-y'  # Перезаписывать без вопросов
-        ]
+        if accurate:
+            # Старый порядок: декодирование от начала файла до точки
+            # разреза - нужен только когда сегмент обязан начаться
+            # не с ключевого кадра
+            cmd = FFMPEG_BASE + [
+                '-loglevel', 'error',
+                '-i', str(video_path),
+                '-ss', str(start_time),
+                '-t', str(end_time - start_time),
+                '-c', 'copy',
+                '-avoid_negative_ts', 'make_zero',
+                str(output_path),
+                '-y'  # Перезаписывать без вопросов
+            ]
+        else:
+            cmd = FFMPEG_BASE + [
+                '-loglevel', 'error',
+                '-ss', str(start_time),
+                '-i', str(video_path),
+                '-t', str(end_time - start_time),
+                '-c', 'copy',
+                '-avoid_negative_ts', 'make_zero',
+                str(output_path),
+                '-y'  # Перезаписывать без вопросов
+            ]
         
         try:
-            subprocess.run(cmd, check=True, capture_output=True)
+            # Вывод FFmpeg здесь никто не читает - не копим его в памяти
+            subprocess.run(cmd, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             return True
         except subprocess.CalledProcessError as e:
             print(f"    Ошибка при создании сегмента: {e}")
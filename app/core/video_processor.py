@@ -9,6 +9,10 @@ from abc import ABC, abstractmethod
 
 from app.config.settings import settings
 
+# Общий префикс команд FFmpeg: -nostdin не дает дочернему процессу
+# трогать терминал, -hide_banner убирает шапку сборки из каждого запуска
+FFMPEG_BASE = ['ffmpeg', '-nostdin', '-hide_banner']
+
 
 class BaseVideoProcessor(ABC):
     """Базовый класс для всех алгоритмов обработки видео"""
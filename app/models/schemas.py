@@ -40,6 +40,15 @@ class ProcessingRequest(BaseModel):
         }
 
 
+class LocalProcessingRequest(ProcessingRequest):
+    """Запрос на обработку файла, уже лежащего на общем диске
+
+    Используется ботом: оба контейнера монтируют ./storage, поэтому
+    вместо повторной загрузки файла по loopback передается только путь.
+    """
+    file_path: str = Field(description="Абсолютный путь к видеофайлу в общем хранилище")
+
+
 class ProcessingResponse(BaseModel):
     """Ответ на запрос обработки"""
     task_id: str = Field(description="Уникальный идентификатор задачи")
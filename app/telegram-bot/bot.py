@@ -3,14 +3,19 @@ Telegram бот для Shorts Maker - ИСПРАВЛЕННАЯ ВЕРСИЯ
 Корректная работа с локальным Bot API для файлов до 2GB
 """
 import asyncio
+import aiofiles
 import aiohttp
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import socket
 import time
 from pathlib import Path
 from typing import Optional, Tuple
 
-from aiogram import Bot, Dispatcher, F
+from aiogram import Bot, Dispatcher, F, Router
 from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import Message, FSInputFile
@@ -19,73 +24,117 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 
-# Настройки
-BOT_TOKEN = os.getenv("BOT_TOKEN", "7718723631:AAHapgiCxXnyugZT_s1kH7_b19eqlDDYhTs")
+# Настройки: токен только из окружения, в исходниках ему не место
+BOT_TOKEN = os.getenv("BOT_TOKEN", "")
+if not BOT_TOKEN:
+    raise RuntimeError("BOT_TOKEN не задан - укажите его в переменных окружения")
 
 # Определяем окружение
 IS_DOCKER = os.path.exists('/.dockerenv')
 if IS_DOCKER:
-    API_BASE_URL = "http://shorts-maker-api:8000"
-    LOCAL_BOT_API_URL = "http://telegram-bot-api:8081"
+    API_BASE_URL = os.getenv("API_BASE_URL", "http://shorts-maker-api:8000")
+    LOCAL_BOT_API_URL = os.getenv("LOCAL_BOT_API_URL", "http://telegram-bot-api:8081")
 else:
-    API_BASE_URL = "http://localhost:8000"
-    LOCAL_BOT_API_URL = "http://localhost:8081"
+    API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+    LOCAL_BOT_API_URL = os.getenv("LOCAL_BOT_API_URL", "http://localhost:8081")
+
+# URL скачивания собираем один раз при импорте, а не f-строкой на каждый файл
+BOT_API_FILE_URL_PREFIX = f"{LOCAL_BOT_API_URL}/file/bot{BOT_TOKEN}"
 
 # Папка для временных файлов
 TEMP_DIR = Path("/app/storage/temp/bot_downloads") if IS_DOCKER else Path("./temp_downloads")
 TEMP_DIR.mkdir(parents=True, exist_ok=True)
 
-# Логирование
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+# Размер чанка для скачивания/загрузки: крупные чанки означают меньше
+# await-циклов в StreamReader и меньше syscall'ов на 2GB файл
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+# Буфер чтения aiohttp: дефолтные 64KB на 2GB видео дают десятки тысяч
+# лишних циклов StreamReader и ошибки "Chunk too big" за некоторыми прокси
+DOWNLOAD_READ_BUFSIZE = 10 * 1024 * 1024  # 10MB
+
+# Логирование: QueueHandler + QueueListener, чтобы синхронная запись в
+# stdout (который под Docker перехватывает демон) не блокировала
+# горячий цикл скачивания
+_log_queue = queue.SimpleQueue()
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(_log_queue)])
+_log_listener = logging.handlers.QueueListener(_log_queue, _stream_handler)
+_log_listener.start()
 logger = logging.getLogger("shorts_bot")
 
+# Поддерживаемые расширения видео (для документов)
+VIDEO_EXTENSIONS = frozenset({'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v'})
+
 # Состояния
 class VideoProcessing(StatesGroup):
     waiting_for_video = State()
     processing = State()
 
 
-async def check_bot_api() -> bool:
-    """Проверяет доступность локального Bot API"""
-    try:
-        timeout = aiohttp.ClientTimeout(total=5)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            url = f"{LOCAL_BOT_API_URL}/bot{BOT_TOKEN}/getMe"
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if data.get('ok'):
-                        logger.info(f"Bot API available: {data.get('result', {}).get('username')}")
-                        return True
-    except Exception as e:
-        logger.warning(f"Bot API check failed: {e}")
-    return False
+# Роутер уровня модуля - хендлеры объявляются один раз при импорте,
+# а не пересоздаются как замыкания внутри main()
+router = Router()
+
+# Единая HTTP-сессия бота: один пул keep-alive соединений на все запросы
+# к основному API и Bot API вместо новой сессии (и нового TCP-рукопожатия)
+# на каждый вызов
+_app_session: Optional[aiohttp.ClientSession] = None
+
+# Ограничитель параллельных передач: десяток одновременных 2GB-скачиваний
+# забивает диск и temp-папку, остальные пользователи ждут в FIFO-очереди
+# семафора вместо деградации всех сразу
+DOWNLOAD_SEM = asyncio.Semaphore(int(os.getenv('MAX_CONCURRENT_DOWNLOADS', '4')))
+
+
+def get_app_session() -> aiohttp.ClientSession:
+    """Возвращает общую ClientSession, создавая ее при первом обращении"""
+    global _app_session
+    if _app_session is None or _app_session.closed:
+        _app_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64, ttl_dns_cache=300, keepalive_timeout=75),
+            timeout=aiohttp.ClientTimeout(total=600)
+        )
+    return _app_session
+
+
+async def close_app_session() -> None:
+    """Закрывает общую сессию при остановке бота"""
+    if _app_session is not None and not _app_session.closed:
+        await _app_session.close()
 
 
 async def create_bot() -> Tuple[Bot, bool]:
-    """Создает бота с правильной конфигурацией"""
-    
-    local_api_available = await check_bot_api()
-    
-    if local_api_available:
+    """Создает бота с правильной конфигурацией
+
+    Отдельный предварительный пинг локального API здесь не нужен:
+    getMe через готовую AiohttpSession и проверяет доступность, и
+    прогревает keep-alive пул, которым дальше пойдут файловые операции.
+    """
+    try:
+        # Создаем API сервер для локального Bot API
+        # is_local=True: aiogram сам понимает, что file_path абсолютный,
+        # и умеет скачивать такие файлы через bot.download_file
+        api_server = TelegramAPIServer.from_base(LOCAL_BOT_API_URL, is_local=True)
+
+        # Создаем сессию БЕЗ параметра timeout - aiogram сам управляет таймаутами
+        session = AiohttpSession(api=api_server)
+
+        # Создаем бота с кастомной сессией
+        bot = Bot(token=BOT_TOKEN, session=session)
+
+        # Проверяем работу (5с достаточно для контейнера в той же сети)
+        me = await asyncio.wait_for(bot.get_me(), timeout=5)
+        logger.info(f"LOCAL Bot API connected: @{me.username} (2GB support)")
+        return bot, True
+
+    except Exception as e:
+        logger.error(f"Failed to setup local API: {e}")
         try:
-            # Создаем API сервер для локального Bot API
-            api_server = TelegramAPIServer.from_base(LOCAL_BOT_API_URL)
-            
-            # Создаем сессию БЕЗ параметра timeout - aiogram сам управляет таймаутами
-            session = AiohttpSession(api=api_server)
-            
-            # Создаем бота с кастомной сессией
-            bot = Bot(token=BOT_TOKEN, session=session)
-            
-            # Проверяем работу
-            me = await bot.get_me()
-            logger.info(f"LOCAL Bot API connected: @{me.username} (2GB support)")
-            return bot, True
-            
-        except Exception as e:
-            logger.error(f"Failed to setup local API: {e}")
-    
+            await bot.session.close()
+        except Exception:
+            pass
+
     # Fallback на стандартный API
     logger.info("Using standard Telegram API (50MB limit)")
     bot = Bot(token=BOT_TOKEN)
@@ -94,10 +143,156 @@ async def create_bot() -> Tuple[Bot, bool]:
     return bot, False
 
 
+def _create_download_connector() -> aiohttp.TCPConnector:
+    """Создает коннектор, настроенный под скачивание больших файлов с локального Bot API"""
+    return aiohttp.TCPConnector(
+        limit=8,
+        limit_per_host=8,
+        ttl_dns_cache=300,
+        use_dns_cache=True,
+        enable_cleanup_closed=True
+    )
+
+
+def _drop_page_cache(file_path: Path) -> None:
+    """Выталкивает страницы файла из page cache (только Linux)
+
+    Скачанное видео читается один раз при отправке в API и удаляется -
+    2GB его страниц в кеше только вытесняют полезные страницы соседних
+    контейнеров.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _tune_download_socket(resp: aiohttp.ClientResponse) -> None:
+    """Настраивает сокет ответа для максимальной пропускной способности
+
+    Отключаем алгоритм Нейгла (скачивание - непрерывный поток) и
+    увеличиваем буфер приема до 8MB - локальный Bot API отдает данные
+    быстрее, чем дефолтный буфер успевает их принимать.
+    """
+    try:
+        sock = resp.connection.transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 << 20)
+    except Exception as e:
+        logger.debug(f"Socket tuning skipped: {e}")
+
+
+def _bot_api_file_url(file_path: str, bot_token: str) -> str:
+    """Строит URL скачивания файла с локального Bot API
+
+    Локальный Bot API возвращает путь вида:
+    /var/lib/telegram-bot-api/TOKEN/videos/file_X.mp4
+    Нужно правильно извлечь относительный путь.
+    """
+    clean_path = file_path
+
+    # Убираем префикс /var/lib/telegram-bot-api/ если есть
+    if clean_path.startswith('/var/lib/telegram-bot-api/'):
+        clean_path = clean_path.replace('/var/lib/telegram-bot-api/', '', 1)
+
+    # Теперь clean_path выглядит как: TOKEN/videos/file_X.mp4
+    # Нужно убрать TOKEN из начала, оставив только videos/file_X.mp4
+
+    # Проверяем, начинается ли путь с токена (может быть с двоеточием или без)
+    token_parts = bot_token.split(':')
+    if len(token_parts) == 2:
+        token_id = token_parts[0]
+        # Ищем и убираем токен из пути
+        if clean_path.startswith(f"{bot_token}/"):
+            clean_path = clean_path.replace(f"{bot_token}/", '', 1)
+        elif clean_path.startswith(f"{token_id}:"):
+            # Находим первый слеш после токена
+            first_slash = clean_path.find('/')
+            if first_slash > 0:
+                clean_path = clean_path[first_slash + 1:]
+
+    # Убираем начальный слеш если остался
+    clean_path = clean_path.lstrip('/')
+
+    # Локальный Bot API ожидает: /file/botTOKEN/относительный_путь
+    return f"{BOT_API_FILE_URL_PREFIX}/{clean_path}"
+
+
+async def stream_download_to_api(file_path: str, filename: str, params: dict) -> Optional[str]:
+    """Качает файл с Bot API и одновременно стримит его в /process
+
+    Вместо двух последовательных передач (скачать 2GB во временный файл,
+    потом загрузить те же 2GB в API) чанки HTTP-ответа Bot API сразу
+    уходят в multipart-запрос к API через ограниченную очередь -
+    половина wall-clock времени и ноль записей на диск.
+    """
+    url = _bot_api_file_url(file_path, BOT_TOKEN)
+    chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=8)
+
+    async def file_chunks():
+        while True:
+            chunk = await chunk_queue.get()
+            if chunk is None:
+                break
+            yield chunk
+
+    timeout = aiohttp.ClientTimeout(total=3600, connect=30, sock_read=600)
+
+    try:
+        async with aiohttp.ClientSession(
+            timeout=timeout,
+            connector=_create_download_connector(),
+            read_bufsize=DOWNLOAD_READ_BUFSIZE
+        ) as session:
+            async with session.get(url) as resp:
+                if resp.status != 200:
+                    logger.error("Stream download HTTP %s", resp.status)
+                    return None
+
+                _tune_download_socket(resp)
+
+                async def producer():
+                    async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        await chunk_queue.put(chunk)
+                    await chunk_queue.put(None)
+
+                producer_task = asyncio.create_task(producer())
+
+                try:
+                    data = aiohttp.FormData()
+                    data.add_field('file', file_chunks(), filename=filename)
+                    data.add_field('meta', json.dumps(params), content_type='application/json')
+
+                    api_url = f"{API_BASE_URL}/api/v1/process"
+                    async with session.post(api_url, data=data) as api_resp:
+                        if api_resp.status == 200:
+                            result = await api_resp.json()
+                            task_id = result.get('task_id')
+                            logger.info("Task created (streamed): %s", task_id)
+                            return task_id
+                        error = await api_resp.text()
+                        logger.error("API error %s: %s", api_resp.status, error[:500])
+                finally:
+                    if not producer_task.done():
+                        producer_task.cancel()
+
+    except Exception as e:
+        logger.error("Streamed upload failed: %s", e)
+
+    return None
+
+
 async def download_file_from_bot_api(file_path: str, destination: Path, bot_token: str) -> bool:
     """Прямое скачивание файла с локального Bot API - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
     max_retries = 3
-    
+
     for attempt in range(max_retries):
         try:
             # Создаем сессию с большими таймаутами
@@ -106,77 +301,78 @@ async def download_file_from_bot_api(file_path: str, destination: Path, bot_toke
                 connect=30,      # 30 секунд на подключение
                 sock_read=600    # 10 минут на чтение
             )
+
+            logger.info("Original file_path from Telegram: %s", file_path)
+            url = _bot_api_file_url(file_path, bot_token)
+            logger.info("Final URL: %s", url)
+            logger.info("Download attempt %d/%d", attempt + 1, max_retries)
             
-            # ИСПРАВЛЕНО: Правильная обработка пути
-            # Локальный Bot API возвращает путь вида:
-            # /var/lib/telegram-bot-api/TOKEN/videos/file_X.mp4
-            # Нужно правильно извлечь относительный путь
-            
-            clean_path = file_path
-            logger.info(f"Original file_path from Telegram: {file_path}")
-            
-            # Убираем префикс /var/lib/telegram-bot-api/ если есть
-            if clean_path.startswith('/var/lib/telegram-bot-api/'):
-                clean_path = clean_path.replace('/var/lib/telegram-bot-api/', '', 1)
-            
-            # Теперь clean_path выглядит как: TOKEN/videos/file_X.mp4
-            # Нужно убрать TOKEN из начала, оставив только videos/file_X.mp4
-            
-            # Проверяем, начинается ли путь с токена (может быть с двоеточием или без)
-            token_parts = bot_token.split(':')
-            if len(token_parts) == 2:
-                token_id = token_parts[0]
-                # Ищем и убираем токен из пути
-                if clean_path.startswith(f"{bot_token}/"):
-                    clean_path = clean_path.replace(f"{bot_token}/", '', 1)
-                elif clean_path.startswith(f"{token_id}:"):
-                    # Находим первый слеш после токена
-                    first_slash = clean_path.find('/')
-                    if first_slash > 0:
-                        clean_path = clean_path[first_slash + 1:]
-            
-            # Убираем начальный слеш если остался
-            clean_path = clean_path.lstrip('/')
-            
-            # Формируем правильный URL
-            # Локальный Bot API ожидает: /file/botTOKEN/относительный_путь
-            url = f"{LOCAL_BOT_API_URL}/file/bot{bot_token}/{clean_path}"
-            
-            logger.info(f"Cleaned path: {clean_path}")
-            logger.info(f"Final URL: {url}")
-            logger.info(f"Download attempt {attempt + 1}/{max_retries}")
-            
-            async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with aiohttp.ClientSession(
+                timeout=timeout,
+                connector=_create_download_connector(),
+                read_bufsize=DOWNLOAD_READ_BUFSIZE
+            ) as session:
                 async with session.get(url) as resp:
+                    _tune_download_socket(resp)
                     if resp.status == 200:
                         total_size = int(resp.headers.get('Content-Length', 0))
                         downloaded = 0
-                        chunk_size = 1024 * 1024  # 1MB chunks
-                        start_time = time.time()
+
+                        # Константы прогресса считаем один раз, а не на каждом чанке
+                        to_mb = 1.0 / (1024 * 1024)
+                        to_percent = (100.0 / total_size) if total_size > 0 else 0.0
+                        total_mb = total_size * to_mb
+
+                        # monotonic() дешевле time() и не прыгает при NTP-коррекции
+                        start_time = time.monotonic()
                         last_log_time = start_time
-                        
-                        with open(destination, 'wb') as f:
-                            async for chunk in resp.content.iter_chunked(chunk_size):
-                                f.write(chunk)
+
+                        # aiofiles: запись в отдельном потоке, event loop
+                        # продолжает вычитывать сокет пока пишется
+                        # предыдущий чанк
+                        async with aiofiles.open(destination, 'wb', buffering=DOWNLOAD_CHUNK_SIZE) as f:
+                            if hasattr(os, 'posix_fadvise'):
+                                # Пишем и потом читаем строго последовательно.
+                                # fileno() у aiofiles синхронный (проксируется
+                                # напрямую), await здесь не нужен
+                                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                            if total_size > 0 and hasattr(os, 'posix_fallocate'):
+                                # Резервируем место сразу: 2GB пишутся одним
+                                # экстентом без роста файла на каждом чанке
+                                try:
+                                    os.posix_fallocate(f.fileno(), 0, total_size)
+                                except OSError:
+                                    pass  # ФС без поддержки fallocate
+                            # readany() отдает ровно то, что доставил сокет:
+                            # iter_chunked резал бы буфер на куски фиксированного
+                            # размера с лишним memcpy внутри StreamReader
+                            while True:
+                                chunk = await resp.content.readany()
+                                if not chunk:
+                                    break
+                                await f.write(chunk)
                                 downloaded += len(chunk)
-                                
+
                                 # Логируем прогресс каждые 3 секунды
-                                current_time = time.time()
+                                current_time = time.monotonic()
                                 if current_time - last_log_time > 3:
-                                    elapsed = current_time - start_time
-                                    speed = downloaded / elapsed / (1024*1024) if elapsed > 0 else 0
-                                    progress = (downloaded / total_size * 100) if total_size > 0 else 0
-                                    logger.info(
-                                        f"Download progress: {progress:.1f}% "
-                                        f"({downloaded/(1024*1024):.1f}/{total_size/(1024*1024):.1f}MB) "
-                                        f"Speed: {speed:.1f}MB/s"
-                                    )
+                                    # isEnabledFor отсекает форматирование
+                                    # f-строки, если INFO выключен
+                                    if logger.isEnabledFor(logging.INFO):
+                                        elapsed = current_time - start_time
+                                        speed = downloaded / elapsed * to_mb if elapsed > 0 else 0
+                                        progress = downloaded * to_percent
+                                        logger.info(
+                                            "Download progress: %.1f%% (%.1f/%.1fMB) Speed: %.1fMB/s",
+                                            progress, downloaded * to_mb, total_mb, speed
+                                        )
                                     last_log_time = current_time
-                        
-                        # Финальная проверка
-                        actual_size = destination.stat().st_size
-                        elapsed = time.time() - start_time
-                        avg_speed = actual_size / elapsed / (1024*1024) if elapsed > 0 else 0
+
+                        # Финальная проверка: размер уже накоплен в цикле,
+                        # лишний stat() после записи не нужен
+                        actual_size = downloaded
+                        elapsed = time.monotonic() - start_time
+                        avg_speed = actual_size / elapsed * to_mb if elapsed > 0 else 0
                         
                         logger.info(
                             f"Download complete: {actual_size/(1024*1024):.1f}MB "
@@ -185,7 +381,7 @@ async def download_file_from_bot_api(file_path: str, destination: Path, bot_toke
                         
                         # Проверяем целостность
                         if total_size > 0 and abs(actual_size - total_size) > 1024:  # 1KB tolerance
-                            logger.warning(f"Size mismatch: expected {total_size}, got {actual_size}")
+                            logger.warning("Size mismatch: expected %s, got %s", total_size, actual_size)
                             if attempt < max_retries - 1:
                                 destination.unlink(missing_ok=True)
                                 await asyncio.sleep(5 * (attempt + 1))
@@ -194,28 +390,28 @@ async def download_file_from_bot_api(file_path: str, destination: Path, bot_toke
                         return True
                     else:
                         error_text = await resp.text()
-                        logger.error(f"HTTP {resp.status}: {error_text[:500]}")
+                        logger.error("HTTP %s: %s", resp.status, error_text[:500])
                         
         except asyncio.TimeoutError:
-            logger.error(f"Timeout on attempt {attempt + 1}")
+            logger.error("Timeout on attempt %d", attempt + 1)
         except Exception as e:
-            logger.error(f"Download error: {e}")
+            logger.error("Download error: %s", e)
         
         if attempt < max_retries - 1:
             wait_time = 5 * (attempt + 1)
-            logger.info(f"Retrying in {wait_time} seconds...")
+            logger.info("Retrying in %d seconds...", wait_time)
             await asyncio.sleep(wait_time)
     
     return False
 
 
-async def download_file(bot: Bot, file_id: str, destination: Path, using_local_api: bool) -> bool:
-    """Универсальное скачивание файла"""
+async def download_file(bot: Bot, file_info, destination: Path, using_local_api: bool) -> bool:
+    """Универсальное скачивание файла
+
+    file_info уже получен вызывающим кодом - один get_file на загрузку,
+    без повторного round-trip к Bot API перед самим скачиванием.
+    """
     try:
-        # Получаем информацию о файле
-        logger.info(f"Getting file info for: {file_id[:20]}...")
-        file_info = await bot.get_file(file_id)
-        
         if not file_info.file_path:
             logger.error("No file_path in response")
             return False
@@ -226,25 +422,66 @@ async def download_file(bot: Bot, file_id: str, destination: Path, using_local_a
         if using_local_api:
             # СПОСОБ 1: Прямой доступ к файлу через общий volume
             direct_path = Path(file_info.file_path)
+            is_bot_api_path = file_info.file_path.startswith('/var/lib/telegram-bot-api/')
+
             if direct_path.exists() and direct_path.is_file():
                 logger.info(f"Using DIRECT file access (shared volume)")
                 try:
-                    import shutil
-                    shutil.copy2(direct_path, destination)
+                    try:
+                        # Хардлинк вместо копирования: создание inode занимает
+                        # микросекунды вместо минут HTTP-передачи 2GB файла
+                        destination.unlink(missing_ok=True)
+                        os.link(direct_path, destination)
+                        logger.info("File hardlinked from Bot API volume")
+                    except OSError:
+                        # Разные файловые системы (EXDEV) - копируем.
+                        # copyfile (а не copy2) использует zero-copy
+                        # os.sendfile на Linux и не тащит метаданные
+                        import shutil
+                        shutil.copyfile(direct_path, destination)
                     actual_size_mb = destination.stat().st_size / (1024 * 1024)
                     logger.info(f"File copied directly: {actual_size_mb:.1f}MB")
                     return True
                 except Exception as e:
                     logger.warning(f"Direct copy failed: {e}, trying HTTP download")
-            
-            # СПОСОБ 2: HTTP скачивание через Bot API
+            elif IS_DOCKER and is_bot_api_path:
+                # Volume telegram-bot-api-data должен быть примонтирован в
+                # docker-compose.yml - если файла нет, это ошибка конфигурации,
+                # а не повод молча скачивать 2GB по HTTP
+                logger.error(
+                    f"Bot API file not found at {direct_path}. "
+                    f"Check the tg-bot-api-data volume mount in docker-compose.yml"
+                )
+                return False
+
+            # СПОСОБ 2: Встроенное скачивание aiogram (знает про is_local)
+            try:
+                logger.info("Using aiogram bot.download_file (local API)")
+                # Свой буферизованный writer и 1MB чанки вместо дефолтных
+                # 64KB aiogram - меньше циклов на многосотмегабайтный файл
+                with open(destination, 'wb', buffering=DOWNLOAD_CHUNK_SIZE) as dest:
+                    await bot.download_file(
+                        file_info.file_path, destination=dest,
+                        chunk_size=DOWNLOAD_CHUNK_SIZE, seek=False
+                    )
+                actual_size_mb = destination.stat().st_size / (1024 * 1024)
+                logger.info(f"Downloaded via aiogram: {actual_size_mb:.1f}MB")
+                return True
+            except Exception as e:
+                logger.warning(f"aiogram download failed: {e}, trying raw HTTP")
+
+            # СПОСОБ 3: HTTP скачивание через Bot API (запасной вариант)
             logger.info("Using HTTP download from local Bot API")
             success = await download_file_from_bot_api(file_info.file_path, destination, BOT_TOKEN)
             return success
         else:
             # Для стандартного API используем встроенный метод
             logger.info("Using standard bot.download_file")
-            await bot.download_file(file_info.file_path, destination)
+            with open(destination, 'wb', buffering=DOWNLOAD_CHUNK_SIZE) as dest:
+                await bot.download_file(
+                    file_info.file_path, destination=dest,
+                    chunk_size=DOWNLOAD_CHUNK_SIZE, seek=False
+                )
             actual_size_mb = destination.stat().st_size / (1024 * 1024)
             logger.info(f"Downloaded via standard API: {actual_size_mb:.1f}MB")
             return True
@@ -254,85 +491,190 @@ async def download_file(bot: Bot, file_id: str, destination: Path, using_local_a
         return False
 
 
+async def _file_sender(file_path: Path):
+    """Отдает файл чанками для стриминговой multipart-загрузки"""
+    async with aiofiles.open(file_path, 'rb') as f:
+        while True:
+            chunk = await f.read(DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+async def _send_path_to_api(file_path: Path, params: dict) -> Optional[str]:
+    """Передает в API путь к файлу на общем диске вместо повторной загрузки
+
+    Оба контейнера монтируют ./storage в /app/storage, так что API может
+    открыть файл напрямую - минус ~1GB loopback-трафика на каждый гигабайт
+    видео.
+    """
+    try:
+        session = get_app_session()
+        payload = {'file_path': str(file_path.resolve()), **params}
+        url = f"{API_BASE_URL}/api/v1/process/local"
+        async with session.post(url, json=payload) as resp:
+            if resp.status == 200:
+                result = await resp.json()
+                task_id = result.get('task_id')
+                logger.info("Task created (local path): %s", task_id)
+                return task_id
+            error = await resp.text()
+            logger.warning("process/local failed %s: %s", resp.status, error[:300])
+    except Exception as e:
+        logger.warning("process/local failed: %s", e)
+    return None
+
+
 async def send_to_api(file_path: Path, params: dict) -> Optional[str]:
     """Отправляет видео в API для обработки"""
     try:
         file_size_mb = file_path.stat().st_size / (1024 * 1024)
-        logger.info(f"Sending to API: {file_path.name} ({file_size_mb:.1f}MB)")
-        
-        timeout = aiohttp.ClientTimeout(total=600)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            data = aiohttp.FormData()
-            
-            # ИСПРАВЛЕНО: читаем файл в память, не держим открытым
-            file_content = file_path.read_bytes()
-            data.add_field('file', file_content, filename=file_path.name)
-            
-            for key, value in params.items():
-                data.add_field(key, str(value))
-            
-            url = f"{API_BASE_URL}/api/v1/process"
-            async with session.post(url, data=data) as resp:
-                if resp.status == 200:
-                    result = await resp.json()
-                    task_id = result.get('task_id')
-                    logger.info(f"Task created: {task_id}")
-                    return task_id
-                else:
-                    error = await resp.text()
-                    logger.error(f"API error {resp.status}: {error}")
+        logger.info("Sending to API: %s (%.1fMB)", file_path.name, file_size_mb)
+
+        # В Docker хранилище общее - сначала пробуем передать только путь
+        if IS_DOCKER:
+            task_id = await _send_path_to_api(file_path, params)
+            if task_id:
+                return task_id
+
+        session = get_app_session()
+        data = aiohttp.FormData()
+
+        # Стримим файл чанками прямо в сокет - видео на сотни мегабайт
+        # не загружается целиком в память
+        data.add_field('file', _file_sender(file_path), filename=file_path.name)
+
+        # Все параметры одним JSON-полем вместо отдельной
+        # multipart-части на каждый ключ
+        data.add_field('meta', json.dumps(params), content_type='application/json')
+
+        url = f"{API_BASE_URL}/api/v1/process"
+        async with session.post(url, data=data) as resp:
+            if resp.status == 200:
+                result = await resp.json()
+                task_id = result.get('task_id')
+                logger.info("Task created: %s", task_id)
+                # Файл больше не понадобится - освобождаем page cache
+                _drop_page_cache(file_path)
+                return task_id
+            else:
+                error = await resp.text()
+                logger.error("API error %s: %s", resp.status, error)
                     
     except Exception as e:
-        logger.error(f"Send to API failed: {e}")
+        logger.error("Send to API failed: %s", e)
     
     return None
 
 
+async def _poll_task_status(session: aiohttp.ClientSession, task_id: str):
+    """Один опрос статуса задачи
+
+    Returns:
+        (fatal, data): fatal=True - задачи больше нет (404), опрашивать
+        дальше бессмысленно; data=None - временная ошибка, можно повторить
+    """
+    url = f"{API_BASE_URL}/api/v1/status/{task_id}"
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+        if resp.status == 200:
+            return False, await resp.json()
+        if resp.status == 404:
+            return True, None
+        return False, None
+
+
+# Общий наблюдатель статусов: один фоновый таск опрашивает API по всем
+# активным задачам на одном keep-alive коннекте. При N параллельных
+# пользователях API получает столько же запросов, сколько при одном,
+# вместо N независимых циклов опроса.
+_watched_tasks: dict = {}  # task_id -> последний ответ API (или None)
+_watch_events: dict = {}   # task_id -> Event "появились новые данные"
+_watcher_task: Optional[asyncio.Task] = None
+WATCH_INTERVAL = 3.0
+
+
+def _register_watch(task_id: str) -> asyncio.Event:
+    """Подписывает задачу на общий опрос статусов"""
+    global _watcher_task
+    event = asyncio.Event()
+    _watched_tasks[task_id] = None
+    _watch_events[task_id] = event
+    if _watcher_task is None or _watcher_task.done():
+        _watcher_task = asyncio.create_task(_status_watcher())
+    return event
+
+
+def _unregister_watch(task_id: str) -> None:
+    """Снимает задачу с опроса; пустой наблюдатель завершится сам"""
+    _watched_tasks.pop(task_id, None)
+    _watch_events.pop(task_id, None)
+
+
+async def _status_watcher() -> None:
+    """Опрашивает статусы всех активных задач одним циклом"""
+    session = get_app_session()
+    while _watched_tasks:
+        for task_id in list(_watched_tasks):
+            if task_id not in _watched_tasks:
+                continue
+            try:
+                fatal, data = await _poll_task_status(session, task_id)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error("Status check error: %s", e)
+                continue
+
+            if fatal:
+                # 404 - задача удалена на сервере, ретраи не помогут
+                data = {"status": "error",
+                        "error_message": "Задача не найдена на сервере"}
+
+            if data is not None and data != _watched_tasks.get(task_id):
+                _watched_tasks[task_id] = data
+                event = _watch_events.get(task_id)
+                if event:
+                    event.set()
+
+        await asyncio.sleep(WATCH_INTERVAL)
+
+
 async def monitor_task(task_id: str, message: Message) -> dict:
-    """Мониторит выполнение задачи с детальным прогрессом"""
-    start_time = time.time()
-    last_update_time = 0
-    last_progress = -1
-    error_count = 0
-    max_errors = 3
-    
-    for attempt in range(720):  # 60 минут максимум (720 * 5 сек)
-        try:
-            timeout = aiohttp.ClientTimeout(total=10)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                url = f"{API_BASE_URL}/api/v1/status/{task_id}"
-                async with session.get(url) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        error_count = 0
-                    else:
-                        error_count += 1
-                        if error_count >= max_errors:
-                            return {"status": "error", "message": f"API недоступен"}
-                        await asyncio.sleep(5)
-                        continue
-                        
-        except Exception as e:
-            error_count += 1
-            logger.error(f"Status check error: {e}")
-            if error_count >= max_errors:
-                return {"status": "error", "message": "Потеряна связь с API"}
-            await asyncio.sleep(5)
-            continue
-        
-        status = data.get('status', 'unknown')
-        progress = data.get('progress', 0)
-        message_text = data.get('message', '')
-        
-        # Обновляем сообщение только если прогресс изменился или прошло 10 секунд
-        current_time = time.time()
-        if progress != last_progress or (current_time - last_update_time) > 10:
-            last_progress = progress
-            last_update_time = current_time
-            elapsed = int(current_time - start_time)
+    """Мониторит выполнение задачи через общий наблюдатель статусов"""
+    # Жесткий монотонный дедлайн: медленные ответы API не растягивают
+    # общее время ожидания, а NTP-коррекция часов его не сдвигает
+    start_time = time.monotonic()
+    deadline = start_time + 3600  # 60 минут максимум
+    last_status_key = None
+    event = _register_watch(task_id)
+
+    try:
+        while time.monotonic() < deadline:
+            try:
+                remaining = deadline - time.monotonic()
+                await asyncio.wait_for(event.wait(), timeout=min(60, max(remaining, 0.1)))
+            except asyncio.TimeoutError:
+                # Данных давно нет - не страшно, дедлайн свое возьмет
+                continue
+            event.clear()
+
+            data = _watched_tasks.get(task_id)
+            if not data:
+                continue
+
+            status = data.get('status', 'unknown')
+            progress = data.get('progress', 0)
+            message_text = data.get('message', '')
+
+            # Редактируем сообщение только если содержимое реально
+            # изменилось - каждый edit_text это отдельный вызов Bot API
+            status_key = (status, progress, message_text)
+            if status_key == last_status_key:
+                continue
+            last_status_key = status_key
+
+            elapsed = int(time.monotonic() - start_time)
             elapsed_min = elapsed // 60
             elapsed_sec = elapsed % 60
-            
+
             try:
                 if status == 'processing':
                     await message.edit_text(
@@ -349,7 +691,7 @@ async def monitor_task(task_id: str, message: Message) -> dict:
                         f"Время: {elapsed_min}:{elapsed_sec:02d}"
                     )
                     return data
-                    
+
                 elif status == 'error':
                     error_msg = data.get('error_message', 'Неизвестная ошибка')
                     await message.edit_text(
@@ -359,166 +701,216 @@ async def monitor_task(task_id: str, message: Message) -> dict:
                     return data
             except Exception:
                 pass
-        
-        await asyncio.sleep(5)
-    
-    await message.edit_text("Превышено время ожидания обработки (60 минут)")
-    return {"status": "timeout"}
+
+        await message.edit_text("Превышено время ожидания обработки (60 минут)")
+        return {"status": "timeout"}
+    finally:
+        _unregister_watch(task_id)
 
 
-async def main():
-    """Главная функция бота"""
-    logger.info("Starting Shorts Maker Bot...")
-    
-    # Ждем API
-    for i in range(30):
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{API_BASE_URL}/api/v1/health", timeout=aiohttp.ClientTimeout(total=5)) as resp:
-                    if resp.status == 200:
-                        logger.info("Main API is ready")
-                        break
-        except:
-            if i == 29:
-                logger.error("Main API timeout")
-                return
-            await asyncio.sleep(2)
-    
-    # Создаем бота
-    bot, using_local_api = await create_bot()
-    dp = Dispatcher(storage=MemoryStorage())
-    
-    # Настройки
-    max_file_size = 2_000_000_000 if using_local_api else 50_000_000
-    max_size_str = "2GB" if using_local_api else "50MB"
-    
-    @dp.message(Command("start", "help"))
-    async def cmd_start(message: Message, state: FSMContext):
+@router.message(Command("start", "help"))
+async def cmd_start(message: Message, state: FSMContext, cfg: dict):
+    await message.answer(
+        f"Привет! Я бот для создания шортсов из видео.\n\n"
+        f"Текущие настройки:\n"
+        f"- Максимальный размер файла: {cfg['max_size_str']}\n"
+        f"- API: {'локальный (большие файлы)' if cfg['using_local_api'] else 'стандартный'}\n"
+        f"- Формат результата: мобильные шортсы 9:16\n\n"
+        f"Просто отправьте мне видеофайл!"
+    )
+    await state.set_state(VideoProcessing.waiting_for_video)
+
+
+@router.message(Command("status"))
+async def cmd_status(message: Message, cfg: dict):
+    statuses = {}
+
+    # Проверяем основной API
+    try:
+        session = get_app_session()
+        async with session.get(f"{API_BASE_URL}/api/v1/health", timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            statuses['main_api'] = 'работает' if resp.status == 200 else f'ошибка {resp.status}'
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        statuses['main_api'] = 'недоступен'
+
+    # Проверяем Bot API
+    statuses['bot_api'] = 'работает (2GB)' if cfg['using_local_api'] else 'стандартный (50MB)'
+
+    await message.answer(
+        f"Статус системы:\n\n"
+        f"Основной API: {statuses['main_api']}\n"
+        f"Bot API: {statuses['bot_api']}\n"
+        f"Макс. размер: {cfg['max_size_str']}"
+    )
+
+
+@router.message(F.video, VideoProcessing.waiting_for_video)
+async def handle_video(message: Message, state: FSMContext, bot: Bot, cfg: dict):
+    await process_media_file(message, state, bot, cfg, message.video, "video")
+
+
+@router.message(F.document, VideoProcessing.waiting_for_video)
+async def handle_document(message: Message, state: FSMContext, bot: Bot, cfg: dict):
+    if not message.document.file_name:
+        await message.answer("Не удалось определить тип файла")
+        return
+
+    # rpartition вместо Path().suffix: без лишних аллокаций объекта Path
+    # на каждый входящий документ. Пустой разделитель = имя без точки,
+    # тогда расширения нет (как у Path().suffix), а не '.всёимя'
+    _, sep, last = message.document.file_name.rpartition('.')
+    ext = '.' + last.lower() if sep else ''
+
+    if ext not in VIDEO_EXTENSIONS:
+        await message.answer(f"Неподдерживаемый формат: {ext}\nПоддерживаются: {', '.join(sorted(VIDEO_EXTENSIONS))}")
+        return
+
+    await process_media_file(message, state, bot, cfg, message.document, "document")
+
+
+@router.message(VideoProcessing.waiting_for_video)
+async def handle_other_messages(message: Message):
+    await message.answer("Отправьте видеофайл для обработки")
+
+
+async def process_media_file(message: Message, state: FSMContext, bot: Bot, cfg: dict, file_obj, file_type: str):
+    """Обрабатывает видеофайл"""
+    await state.set_state(VideoProcessing.processing)
+
+    using_local_api = cfg['using_local_api']
+    file_size = file_obj.file_size or 0
+    file_size_mb = file_size / (1024 * 1024)
+
+    logger.info(f"Processing {file_type}: {file_size_mb:.1f}MB")
+
+    # Проверяем размер
+    if file_size > cfg['max_file_size']:
         await message.answer(
-            f"Привет! Я бот для создания шортсов из видео.\n\n"
-            f"Текущие настройки:\n"
-            f"- Максимальный размер файла: {max_size_str}\n"
-            f"- API: {'локальный (большие файлы)' if using_local_api else 'стандартный'}\n"
-            f"- Формат результата: мобильные шортсы 9:16\n\n"
-            f"Просто отправьте мне видеофайл!"
+            f"Файл слишком большой: {file_size_mb:.1f}MB\n"
+            f"Максимальный размер: {cfg['max_size_str']}"
         )
         await state.set_state(VideoProcessing.waiting_for_video)
-    
-    @dp.message(Command("status"))
-    async def cmd_status(message: Message):
-        statuses = {}
-        
-        # Проверяем основной API
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{API_BASE_URL}/api/v1/health", timeout=aiohttp.ClientTimeout(total=5)) as resp:
-                    statuses['main_api'] = 'работает' if resp.status == 200 else f'ошибка {resp.status}'
-        except:
-            statuses['main_api'] = 'недоступен'
-        
-        # Проверяем Bot API
-        statuses['bot_api'] = 'работает (2GB)' if using_local_api else 'стандартный (50MB)'
-        
-        await message.answer(
-            f"Статус системы:\n\n"
-            f"Основной API: {statuses['main_api']}\n"
-            f"Bot API: {statuses['bot_api']}\n"
-            f"Макс. размер: {max_size_str}"
-        )
-    
-    @dp.message(F.video, VideoProcessing.waiting_for_video)
-    async def handle_video(message: Message, state: FSMContext):
-        await process_media_file(message, state, message.video, "video")
-    
-    @dp.message(F.document, VideoProcessing.waiting_for_video)
-    async def handle_document(message: Message, state: FSMContext):
-        if not message.document.file_name:
-            await message.answer("Не удалось определить тип файла")
-            return
-            
-        ext = Path(message.document.file_name).suffix.lower()
-        video_extensions = {'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v'}
-        
-        if ext not in video_extensions:
-            await message.answer(f"Неподдерживаемый формат: {ext}\nПоддерживаются: {', '.join(video_extensions)}")
-            return
-            
-        await process_media_file(message, state, message.document, "document")
-    
-    async def process_media_file(message: Message, state: FSMContext, file_obj, file_type: str):
-        """Обрабатывает видеофайл"""
-        await state.set_state(VideoProcessing.processing)
-        
-        file_size = file_obj.file_size or 0
+        return
+
+    status_msg = await message.answer(
+        f"Скачиваю видео ({file_size_mb:.1f}MB)...\n"
+        f"Это может занять некоторое время."
+    )
+
+    # Получаем информацию о файле один раз - и для имени, и для скачивания
+    file_info = None
+    try:
+        logger.info(f"Getting file info for: {file_obj.file_id[:20]}...")
+        file_info = await bot.get_file(file_obj.file_id)
+    except Exception as e:
+        logger.error(f"get_file failed: {e}")
+
+    if not file_info or not file_info.file_path:
+        await status_msg.edit_text("Не удалось получить информацию о файле. Попробуйте позже.")
+        await state.set_state(VideoProcessing.waiting_for_video)
+        return
+
+    # У пересланных/стриминговых загрузок file_size может отсутствовать -
+    # выясняем размер до скачивания (stat по общему volume или дешевый
+    # HEAD), чтобы не тянуть 2GB ради отказа
+    if not file_size and using_local_api:
+        direct_path = Path(file_info.file_path)
+        if direct_path.exists():
+            file_size = direct_path.stat().st_size
+        else:
+            try:
+                head_url = _bot_api_file_url(file_info.file_path, BOT_TOKEN)
+                session = get_app_session()
+                async with session.head(head_url, timeout=aiohttp.ClientTimeout(total=10)) as h:
+                    file_size = int(h.headers.get('Content-Length', 0))
+            except Exception as e:
+                logger.warning(f"Preflight size check failed: {e}")
+
         file_size_mb = file_size / (1024 * 1024)
-        
-        logger.info(f"Processing {file_type}: {file_size_mb:.1f}MB")
-        
-        # Проверяем размер
-        if file_size > max_file_size:
-            await message.answer(
+        if file_size > cfg['max_file_size']:
+            await status_msg.edit_text(
                 f"Файл слишком большой: {file_size_mb:.1f}MB\n"
-                f"Максимальный размер: {max_size_str}"
+                f"Максимальный размер: {cfg['max_size_str']}"
             )
             await state.set_state(VideoProcessing.waiting_for_video)
             return
-        
-        status_msg = await message.answer(
-            f"Скачиваю видео ({file_size_mb:.1f}MB)...\n"
-            f"Это может занять некоторое время."
-        )
-        
-        # Генерируем имя файла
-        filename = getattr(file_obj, 'file_name', None) or f"video_{message.from_user.id}_{file_obj.file_id[:8]}.mp4"
-        video_path = TEMP_DIR / filename
-        
-        # Скачиваем
-        start_time = time.time()
-        success = await download_file(bot, file_obj.file_id, video_path, using_local_api)
-        download_time = time.time() - start_time
-        
-        if not success:
+
+    # Стабильное имя по file_unique_id: при повторной отправке того же
+    # файла путь не меняется (задел под докачку по Range)
+    original_name = getattr(file_obj, 'file_name', None)
+    ext = Path(original_name).suffix.lower() if original_name else '.mp4'
+    filename = f"video_{file_obj.file_unique_id}{ext or '.mp4'}"
+    video_path = TEMP_DIR / filename
+
+    # Параметры обработки
+    params = {
+        'algorithm': 'multi_shorts',
+        'min_duration': 30,
+        'max_duration': 90,
+        'enable_subtitles': 'false',
+        'mobile_scale_factor': 1.2
+    }
+
+    start_time = time.time()
+    task_id = None
+    result = None
+
+    # Скачанный файл удаляется в finally: даже если мониторинг или
+    # отправка упадут с исключением, 2GB не осядут в temp-папке
+    try:
+        # Семафор пускает лишь несколько передач одновременно -
+        # остальные честно ждут в очереди, а не толкаются за диск
+        if DOWNLOAD_SEM.locked():
             await status_msg.edit_text(
-                f"Ошибка при скачивании файла.\n"
-                f"Попробуйте файл меньшего размера или повторите позже."
+                f"Файл в очереди на скачивание ({file_size_mb:.1f}MB)...\n"
+                f"Сейчас обрабатываются другие загрузки."
             )
-            await state.set_state(VideoProcessing.waiting_for_video)
-            return
-        
-        actual_size_mb = video_path.stat().st_size / (1024 * 1024)
-        speed_mb = actual_size_mb / download_time if download_time > 0 else 0
-        
-        await status_msg.edit_text(
-            f"Файл скачан ({actual_size_mb:.1f}MB за {download_time:.1f}с, {speed_mb:.1f}MB/s)\n"
-            f"Отправляю на обработку..."
-        )
-        
-        # Отправляем в API
-        params = {
-            'algorithm': 'multi_shorts',
-            'min_duration': 30,
-            'max_duration': 90,
-            'enable_subtitles': 'false',
-            'mobile_scale_factor': 1.2
-        }
-        
-        task_id = await send_to_api(video_path, params)
-        
+
+        async with DOWNLOAD_SEM:
+            # Конвейер: если файл доступен только по HTTP, скачивание с Bot API и
+            # загрузка в основной API идут одновременно - без 2GB на диске и без
+            # двух последовательных передач
+            if using_local_api and not IS_DOCKER and not Path(file_info.file_path).exists():
+                task_id = await stream_download_to_api(file_info.file_path, filename, params)
+                if task_id:
+                    logger.info(f"Streamed pipeline finished in {time.time() - start_time:.1f}s")
+
+            if not task_id:
+                # Обычный путь: скачиваем на диск, затем отправляем в API
+                success = await download_file(bot, file_info, video_path, using_local_api)
+                download_time = time.time() - start_time
+
+                if not success:
+                    await status_msg.edit_text(
+                        f"Ошибка при скачивании файла.\n"
+                        f"Попробуйте файл меньшего размера или повторите позже."
+                    )
+                    return
+
+                actual_size_mb = video_path.stat().st_size / (1024 * 1024)
+                speed_mb = actual_size_mb / download_time if download_time > 0 else 0
+
+                await status_msg.edit_text(
+                    f"Файл скачан ({actual_size_mb:.1f}MB за {download_time:.1f}с, {speed_mb:.1f}MB/s)\n"
+                    f"Отправляю на обработку..."
+                )
+
+                # Отправляем в API
+                task_id = await send_to_api(video_path, params)
+
         if not task_id:
             await status_msg.edit_text("Ошибка при отправке в API. Попробуйте позже.")
-            video_path.unlink(missing_ok=True)
-            await state.set_state(VideoProcessing.waiting_for_video)
             return
-        
+
         # Мониторим прогресс
         await status_msg.edit_text(f"Обрабатываю видео...\nTask ID: {task_id}")
         result = await monitor_task(task_id, status_msg)
-        
+
         if result.get('status') == 'completed':
             # Отправляем ссылку на результат
             # Для пользователя используем localhost (снаружи Docker)
             download_url = f"http://localhost:8000/api/v1/telegram/download-zip/{task_id}"
-            
+
             await message.answer(
                 f"Готово! Ваши шортсы готовы!\n\n"
                 f"Скачать архив:\n{download_url}\n\n"
@@ -529,20 +921,66 @@ async def main():
             await message.answer(f"Ошибка обработки:\n{error_msg}")
         else:
             await message.answer("Превышено время ожидания обработки")
-        
-        # Очистка
-        video_path.unlink(missing_ok=True)
+    finally:
+        # Очистка выполняется на ошибках и по завершении, но не под
+        # живой задачей: /process/local обрабатывает файл бота прямо на
+        # общем диске, и удалить его по таймауту мониторинга - значит
+        # выдернуть исходник из-под еще идущей обработки. Файл остается
+        # только когда задача создана и не дошла до конечного статуса.
+        # Вместе с видео убираем и sidecar-кеш анализа, который ядро
+        # пишет рядом с файлом - иначе .cutpoints.json копятся в temp
+        final_status = (result or {}).get('status')
+        if task_id is None or final_status in ('completed', 'error'):
+            video_path.unlink(missing_ok=True)
+            Path(str(video_path) + '.cutpoints.json').unlink(missing_ok=True)
         await state.set_state(VideoProcessing.waiting_for_video)
+
+
+async def main():
+    """Главная функция бота"""
+    logger.info("Starting Shorts Maker Bot...")
     
-    @dp.message(VideoProcessing.waiting_for_video)
-    async def handle_other_messages(message: Message):
-        await message.answer("Отправьте видеофайл для обработки")
-    
-    logger.info(f"Bot ready! Max size: {max_size_str}")
+    # Ждем API: одна сессия на все попытки вместо 30 новых соединений,
+    # HEAD вместо GET (тело ответа нам не нужно)
+    api_ready = False
+    timeout = aiohttp.ClientTimeout(total=5)
+    session = get_app_session()
+    for i in range(30):
+        try:
+            async with session.head(f"{API_BASE_URL}/api/v1/health", timeout=timeout) as resp:
+                if resp.status == 200:
+                    logger.info("Main API is ready")
+                    api_ready = True
+                    break
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # Ловим только сетевые ошибки - bare except глотал CancelledError
+            pass
+        # Экспоненциальный бэкофф с потолком 5 секунд
+        await asyncio.sleep(min(0.5 * (2 ** i), 5))
+
+    if not api_ready:
+        logger.error("Main API timeout")
+        return
     
+    # Создаем бота
+    bot, using_local_api = await create_bot()
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(router)
+
+    # Конфигурация передается хендлерам через workflow data диспетчера
+    cfg = {
+        'using_local_api': using_local_api,
+        'max_file_size': 2_000_000_000 if using_local_api else 50_000_000,
+        'max_size_str': "2GB" if using_local_api else "50MB",
+    }
+    dp["cfg"] = cfg
+
+    logger.info(f"Bot ready! Max size: {cfg['max_size_str']}")
+
     try:
         await dp.start_polling(bot)
     finally:
+        await close_app_session()
         await bot.session.close()
 
 
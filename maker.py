@@ -4,17 +4,18 @@
 Просто положите видео в папку 'input_videos' и запустите скрипт
 """
 
+import bisect
+import hashlib
 import os
+import re
 import subprocess
 import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Tuple
 import numpy as np
 
-# Используем рабочий импорт
-from moviepy import VideoFileClip
-print("moviepy импортирован успешно")
-
 # Пробуем импорт whisper
 try:
     import whisper
@@ -23,6 +24,44 @@ except ImportError:
     print("whisper не найден, субтитры будут отключены")
     whisper = None
 
+# Блок SRT: номер, строка времени, текст до пустой строки.
+# Компилируется один раз - parse_srt_content прогоняет его по всему файлу
+_SRT_BLOCK_RE = re.compile(
+    r'(\d+)\s*\n'
+    r'(\d{2}):(\d{2}):(\d{2}),(\d{3}) --> (\d{2}):(\d{2}):(\d{2}),(\d{3})\s*\n'
+    r'(.*?)(?=\n\n|\Z)',
+    re.S
+)
+
+# Веса для перевода (часы, минуты, секунды, миллисекунды) в секунды
+_SRT_TIME_WEIGHTS = np.array([3600.0, 60.0, 1.0, 1e-3])
+
+# Частота, с которой Whisper ожидает аудио
+AUDIO_SAMPLE_RATE = 16000
+
+# Метки времени в выводе showinfo и silencedetect. Байтовые регэкспы
+# гоняются по сырому stderr FFmpeg без декодирования и разбиения на строки
+_PTS_TIME_RE = re.compile(rb'pts_time:(-?\d+(?:\.\d+)?)')
+# Разделитель и ':' (stderr silencedetect), и '=' (вывод ametadata)
+_SILENCE_START_RE = re.compile(rb'silence_start[:=]\s*(-?\d+(?:\.\d+)?)')
+
+
+@dataclass(frozen=True)
+class FFCaps:
+    """Возможности установленного FFmpeg, определенные один раз при старте
+
+    Горячие методы сверяются с готовыми полями вместо повторных запусков
+    ffmpeg -version / -encoders / -h filter=... на каждый вызов.
+    """
+    available: bool          # ffmpeg вообще найден в PATH
+    version_line: str        # первая строка баннера для диагностики
+    h264_encoder: str        # самый быстрый доступный H.264 энкодер
+    has_peak_silence: bool   # silencedetect поддерживает mode=peak
+    has_libass: bool         # сборка с libass (фильтры subtitles/ass)
+    nproc: int               # число ядер CPU
+
+
+
 class VideoShortsProcessor:
     def __init__(self):
         """
@@ -55,84 +94,289 @@ class VideoShortsProcessor:
         #     print("Субтитры будут отключены")
         #     self.whisper_model = None
         
+        # Потоки FFmpeg на один запуск: при пуле процессов не даем
+        # каждому ffmpeg захватить все ядра. По умолчанию 4 - реальный
+        # потолок, а не 0 ("FFmpeg решает сам" = все ядра каждому);
+        # SHORTS_FFMPEG_THREADS=0 снимает ограничение явно
+        self.ffmpeg_threads = int(os.getenv('SHORTS_FFMPEG_THREADS', '4'))
+
+        # Кеш метаданных ffprobe по пути файла
+        self._probe_cache = {}
+
+        # Возможности FFmpeg определяем один раз - дальше только булевы
+        self.caps = self._detect_ffmpeg_caps()
+
         # Поддерживаемые форматы видео
         self.video_extensions = {'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv', '.webm', '.m4v'}
     
     def find_video_files(self) -> List[Path]:
-        """Находит все видеофайлы в папке input_videos"""
-        video_files = []
-        for file_path in self.input_folder.rglob('*'):
-            if file_path.suffix.lower() in self.video_extensions:
-                video_files.append(file_path)
+        """Находит все видеофайлы в папке input_videos
+
+        rglob по каждому расширению вместо rglob('*') с фильтром в Python:
+        посторонние файлы отсеиваются еще на уровне обхода каталога.
+        """
+        video_files = set()
+        for ext in self.video_extensions:
+            video_files.update(self.input_folder.rglob(f'*{ext}'))
+            video_files.update(self.input_folder.rglob(f'*{ext.upper()}'))
         return sorted(video_files)
     
-    def detect_scene_changes(self, video_path: Path) -> List[float]:
+    def _detect_ffmpeg_caps(self) -> FFCaps:
+        """Собирает возможности FFmpeg одним стартовым опросом
+
+        Запуск 'ffmpeg -encoders' без -hide_banner дает сразу и список
+        энкодеров (stdout), и баннер с версией и строкой configuration
+        (stderr) - из нее видно, собран ли libass. Справка по фильтру -
+        отдельный exit-опцион FFmpeg, поэтому режим mode=peak для
+        silencedetect проверяется вторым запуском. Больше нигде в коде
+        ffmpeg ради самодиагностики не вызывается.
         """
-        Определяет моменты смены сцен с помощью FFmpeg
-        Возвращает список временных меток в секундах
+        version_line = ''
+        h264_encoder = 'libx264'
+        has_libass = False
+        has_peak = False
+        available = False
+
+        try:
+            result = subprocess.run(
+                ['ffmpeg', '-encoders'],
+                capture_output=True, text=True
+            )
+            available = result.returncode == 0
+            banner = result.stderr or ''
+            version_line = banner.split('\n')[0] if banner else ''
+            has_libass = '--enable-libass' in banner
+
+            # Аппаратные энкодеры (NVENC/QSV/VideoToolbox) ускоряют
+            # мобильную конвертацию - самый тяжелый этап - в разы
+            encoders = result.stdout or ''
+            for candidate in ('h264_nvenc', 'h264_qsv', 'h264_videotoolbox'):
+                if candidate in encoders:
+                    print(f"Найден аппаратный энкодер: {candidate}")
+                    h264_encoder = candidate
+                    break
+
+            # Пиковый детектор тишины быстрее RMS, но есть не везде
+            help_result = subprocess.run(
+                ['ffmpeg', '-hide_banner', '-h', 'filter=silencedetect'],
+                capture_output=True, text=True
+            )
+            help_text = (help_result.stdout or '') + (help_result.stderr or '')
+            has_peak = 'mode' in help_text and 'peak' in help_text
+        except Exception as e:
+            print(f"Не удалось определить возможности FFmpeg: {e}")
+
+        return FFCaps(
+            available=available,
+            version_line=version_line,
+            h264_encoder=h264_encoder,
+            has_peak_silence=has_peak,
+            has_libass=has_libass,
+            nproc=os.cpu_count() or 4,
+        )
+
+    def _h264_encode_args(self, encoder: str) -> List[str]:
+        """Аргументы кодирования для выбранного энкодера"""
+        if encoder == 'h264_nvenc':
+            return ['-c:v', 'h264_nvenc', '-preset', 'p4', '-b:v', '4M', '-pix_fmt', 'yuv420p']
+        if encoder in ('h264_qsv', 'h264_videotoolbox'):
+            return ['-c:v', encoder, '-b:v', '4M', '-pix_fmt', 'yuv420p']
+        return ['-c:v', 'libx264']
+
+    def _probe(self, video_path: Path) -> dict:
+        """Читает длительность и разрешение видео через ffprobe
+
+        moviepy ради пары полей запускал целый декодер на каждый клип;
+        ffprobe читает только заголовок контейнера. Результат кешируется
+        по пути - повторные обращения к тому же файлу бесплатны.
         """
+        key = str(video_path)
+        cached = self._probe_cache.get(key)
+        if cached is not None:
+            return cached
+
         cmd = [
-            'ffmpeg',
-            '-i', str(video_path),
-            '-filter:v', 'select="gt(scene,0.3)",showinfo',
-            '-f', 'null',
-            '-y',
-            '-'
+            'ffprobe',
+            '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height:format=duration',
+            '-of', 'json',
+            key
         ]
-        
+
+        info = {}
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            scene_times = []
-            
-            # Ищем в stderr где FFmpeg выводит информацию
-            output_text = result.stderr if result.stderr else result.stdout
-            
-            for line in output_text.split('\n'):
-                if 'pts_time:' in line:
-                    try:
-                        time_str = line.split('pts_time:')[1].split()[0]
-                        scene_times.append(float(time_str))
-                    except (IndexError, ValueError):
-                        continue
-            
-            return sorted(scene_times)
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            data = json.loads(result.stdout)
+            stream = (data.get('streams') or [{}])[0]
+            info = {
+                'width': int(stream.get('width', 0)),
+                'height': int(stream.get('height', 0)),
+                'duration': float(data.get('format', {}).get('duration', 0.0)),
+            }
         except Exception as e:
-            print(f"Ошибка при определении сцен: {e}")
-            return []
-    
-    def detect_silence_pauses(self, video_path: Path, silence_threshold: float = -30) -> List[float]:
+            print(f"  Ошибка ffprobe: {e}")
+
+        self._probe_cache[key] = info
+        return info
+
+    def _ffmpeg_base(self, quiet: bool = True) -> List[str]:
+        """Общий префикс команд FFmpeg
+
+        -threads ограничивает внутренние потоки кодека, чтобы при
+        параллельной обработке суммарное число потоков не превышало
+        число ядер. quiet=False оставляет info-лог: его разбирают
+        детекторы сцен и тишины (showinfo/silencedetect пишут в info).
+        """
+        cmd = ['ffmpeg', '-nostdin', '-hide_banner']
+        if self.ffmpeg_threads > 0:
+            cmd += ['-threads', str(self.ffmpeg_threads)]
+        if quiet:
+            cmd += ['-loglevel', 'error']
+        return cmd
+
+    def _parse_analysis_output(self, output: bytes, scene_times: List[float], silence_times: List[float]):
+        """Разбирает stderr FFmpeg: pts_time -> сцены, silence_start -> паузы
+
+        Два finditer по байтам вместо построчного split: без O(строк)
+        временных списков и декодирования всего вывода.
         """
-        Определяет паузы в аудио (тишина) для логических разрывов
+        scene_times.extend(float(m.group(1)) for m in _PTS_TIME_RE.finditer(output))
+        silence_times.extend(float(m.group(1)) for m in _SILENCE_START_RE.finditer(output))
+
+    def _run_analysis_cmd(self, cmd: List[str], scene_times: List[float],
+                          silence_times: List[float]) -> int:
+        """Запускает FFmpeg-анализ, разбирая stderr по мере появления
+
+        capture_output копил бы весь stderr в памяти до завершения
+        процесса (showinfo пишет строку на каждый оставленный кадр).
+        Чтение кусками по 64КБ держит потребление памяти константным;
+        разбор идет только по целым строкам - неполная последняя строка
+        куска остается «хвостом» до следующего чтения, иначе метка,
+        разрезанная границей куска, распарсилась бы как усеченное число.
         """
-        cmd = [
-            'ffmpeg',
-            '-i', str(video_path),
-            '-af', f'silencedetect=noise={silence_threshold}dB:duration=1',
-            '-f', 'null',
+        process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        tail = b''
+        try:
+            while True:
+                chunk = process.stderr.read(65536)
+                if not chunk:
+                    break
+                data = tail + chunk
+                cut = data.rfind(b'\n') + 1
+                self._parse_analysis_output(data[:cut], scene_times, silence_times)
+                tail = data[cut:]
+            self._parse_analysis_output(tail, scene_times, silence_times)
+        finally:
+            process.stderr.close()
+        return process.wait()
+
+    def _analysis_cache_path(self, video_path: Path) -> Path:
+        """Путь к кешу анализа, привязанный к содержимому файла
+
+        Ключ включает mtime и размер: измененное видео автоматически
+        получает новый кеш, старый остается мусором в .cache.
+        """
+        stat = video_path.stat()
+        key = f"{video_path.resolve()}:{stat.st_mtime_ns}:{stat.st_size}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        cache_dir = self.output_folder / '.cache'
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        return cache_dir / f"{digest}.json"
+
+    @staticmethod
+    def _filter_file_arg(path: Path) -> str:
+        """Экранирует путь для опции file= внутри графа фильтров"""
+        return str(path).replace('\\', '/').replace(':', '\\:')
+
+    def _analyze_video(self, video_path: Path, silence_threshold: float = -30) -> Tuple[List[float], List[float]]:
+        """
+        Определяет смены сцен и паузы в аудио за ОДИН проход FFmpeg
+
+        Раньше сцены и тишина искались двумя отдельными запусками, каждый
+        из которых полностью декодировал видео. filter_complex с
+        раздельными видео- и аудиоветками декодирует файл один раз -
+        анализ примерно вдвое быстрее.
+
+        Метки времени пишутся фильтрами metadata/ametadata в отдельные
+        файлы - чистый машиночитаемый вывод, не перемешанный со строками
+        прогресса и предупреждениями FFmpeg в stderr. Если файлы пусты
+        (старый FFmpeg), разбираем stderr как раньше.
+        """
+        scene_meta_path = self.output_folder / f".scene_meta_{os.getpid()}.txt"
+        silence_meta_path = self.output_folder / f".silence_meta_{os.getpid()}.txt"
+
+        silence_mode = ':mode=peak' if self.caps.has_peak_silence else ''
+
+        cmd = self._ffmpeg_base(quiet=False) + [
             '-y',
-            '-'
+            '-i', str(video_path),
+            '-sn', '-dn',
+            '-filter_complex',
+            (
+                # scale=320:-1 перед детектором сцен: SAD считается по
+                # уменьшенной копии кадра, pts_time остаются исходными -
+                # на HD/4K анализ в разы быстрее без потери точек разреза.
+                # Явные [0:v:0]/[0:a:0] - декодируем ровно по одному потоку
+                # каждой модальности, остальные дорожки не трогаем
+                f"[0:v:0]scale=320:-1,select='gt(scene,0.3)',"
+                f"metadata=mode=print:file='{self._filter_file_arg(scene_meta_path)}'[v];"
+                f"[0:a:0]silencedetect=noise={silence_threshold}dB:duration=1{silence_mode},"
+                f"ametadata=mode=print:key=lavfi.silence_start:"
+                f"file='{self._filter_file_arg(silence_meta_path)}'[a]"
+            ),
+            '-map', '[v]', '-f', 'null', '-',
+            '-map', '[a]', '-f', 'null', '-'
         ]
-        
+
+        scene_times = []
+        silence_times = []
+
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            silence_times = []
-            
-            # Ищем в stderr где FFmpeg выводит информацию
-            output_text = result.stderr if result.stderr else result.stdout
-            
-            for line in output_text.split('\n'):
-                if 'silence_start:' in line:
-                    try:
-                        time_str = line.split('silence_start:')[1].split()[0]
-                        silence_times.append(float(time_str))
-                    except (IndexError, ValueError):
-                        continue
-            
-            return sorted(silence_times)
+            # stderr разбираем на лету в запасные списки: они нужны,
+            # только если metadata-файлы окажутся пустыми (старый FFmpeg)
+            stderr_scenes: List[float] = []
+            stderr_silence: List[float] = []
+            returncode = self._run_analysis_cmd(cmd, stderr_scenes, stderr_silence)
+
+            # Сначала чистый вывод metadata-фильтров: каждый файл
+            # разбираем только своим паттерном - в файле тишины тоже
+            # есть pts_time, но сценами они не являются
+            if scene_meta_path.exists():
+                scene_times.extend(
+                    float(m.group(1)) for m in _PTS_TIME_RE.finditer(scene_meta_path.read_bytes())
+                )
+            if silence_meta_path.exists():
+                silence_times.extend(
+                    float(m.group(1)) for m in _SILENCE_START_RE.finditer(silence_meta_path.read_bytes())
+                )
+
+            if not scene_times and not silence_times:
+                # metadata-файлы пустые - берем то, что нашлось в stderr
+                scene_times.extend(stderr_scenes)
+                silence_times.extend(stderr_silence)
+
+            if returncode != 0 and not scene_times and not silence_times:
+                # Скорее всего нет аудиодорожки - анализируем только видео
+                cmd_video = self._ffmpeg_base(quiet=False) + [
+                    '-y',
+                    '-i', str(video_path),
+                    '-an', '-sn', '-dn',
+                    '-filter:v', "scale=320:-1,select='gt(scene,0.3)',showinfo",
+                    '-f', 'null',
+                    '-'
+                ]
+                self._run_analysis_cmd(cmd_video, scene_times, silence_times)
+
+            # FFmpeg выдает метки монотонно - сортировка не нужна
+            return scene_times, silence_times
         except Exception as e:
-            print(f"Ошибка при определении пауз: {e}")
-            return []
-    
+            print(f"Ошибка при анализе видео: {e}")
+            return [], []
+        finally:
+            scene_meta_path.unlink(missing_ok=True)
+            silence_meta_path.unlink(missing_ok=True)
+
     def get_optimal_cut_points(self, video_path: Path) -> List[Tuple[float, float]]:
         """
         Определяет оптимальные точки нарезки на основе сцен и пауз
@@ -140,19 +384,43 @@ class VideoShortsProcessor:
         """
         print("   Анализируем видео для поиска логических точек разреза...")
         
-        # Получаем длительность видео
-        try:
-            with VideoFileClip(str(video_path)) as clip:
-                duration = clip.duration
-        except Exception as e:
-            print(f"  Ошибка при получении длительности видео: {e}")
+        # Получаем длительность видео (ffprobe читает только заголовок)
+        duration = self._probe(video_path).get('duration', 0.0)
+        if not duration:
+            print("  Ошибка при получении длительности видео")
             return []
         
         print(f"  Длительность видео: {duration:.1f} секунд")
         
-        # Получаем точки смены сцен и пауз
-        scene_changes = self.detect_scene_changes(video_path)
-        silence_pauses = self.detect_silence_pauses(video_path)
+        # Кеш анализа на диске: повторный запуск по тому же файлу
+        # (например, после смены min/max длительности) не гоняет FFmpeg
+        cache_path = None
+        scene_changes = silence_pauses = None
+        try:
+            cache_path = self._analysis_cache_path(video_path)
+            if cache_path.exists():
+                cached = json.loads(cache_path.read_text(encoding='utf-8'))
+                scene_changes = cached['scene_changes']
+                silence_pauses = cached['silence_pauses']
+                print("  Результаты анализа взяты из кеша")
+        except Exception:
+            scene_changes = silence_pauses = None
+
+        if scene_changes is None:
+            # Получаем точки смены сцен и пауз (один проход FFmpeg на оба анализа)
+            scene_changes, silence_pauses = self._analyze_video(video_path)
+            # Пустой результат - скорее сбой FFmpeg, чем свойство видео;
+            # кешировать его нельзя, иначе перезапуск навсегда пойдет мимо
+            # детекторов (ключ по mtime+size сам не обесценится)
+            if cache_path is not None and (scene_changes or silence_pauses):
+                try:
+                    cache_path.write_text(json.dumps({
+                        'scene_changes': scene_changes,
+                        'silence_pauses': silence_pauses,
+                        'duration': duration,
+                    }), encoding='utf-8')
+                except OSError:
+                    pass
         
         print(f"  Найдено смен сцен: {len(scene_changes)}")
         print(f"  Найдено пауз: {len(silence_pauses)}")
@@ -173,14 +441,16 @@ class VideoShortsProcessor:
             
             # Если сегмент слишком длинный, ищем промежуточную точку
             if segment_duration > self.max_duration:
-                # Ищем ближайшую точку разреза в пределах max_duration
+                # Ближайшая точка разреза в пределах max_duration - это
+                # самая правая точка <= target_end; all_cuts отсортирован,
+                # так что bisect находит ее за O(log N) вместо прохода
+                # по всем точкам
                 target_end = current_start + self.max_duration
-                best_cut = current_start + self.max_duration
-                
-                for potential_cut in all_cuts:
-                    if current_start < potential_cut <= target_end:
-                        if abs(potential_cut - target_end) < abs(best_cut - target_end):
-                            best_cut = potential_cut
+                idx = bisect.bisect_right(all_cuts, target_end) - 1
+                if idx >= 0 and all_cuts[idx] > current_start:
+                    best_cut = all_cuts[idx]
+                else:
+                    best_cut = target_end
                 
                 segments.append((current_start, best_cut))
                 current_start = best_cut
@@ -194,33 +464,110 @@ class VideoShortsProcessor:
         
         return segments
     
-    def extract_segment(self, video_path: Path, start_time: float, end_time: float, output_path: Path):
-        """Извлекает сегмент видео"""
-        cmd = [
-            'ffmpeg',
+    def extract_segments(self, video_path: Path, segments: List[Tuple[float, float]],
+                         output_folder: Path) -> List[Path]:
+        """Извлекает ВСЕ сегменты одним запуском FFmpeg
+
+        Сегменты из get_optimal_cut_points непрерывны и начинаются с нуля,
+        поэтому segment-муксер с явными точками разреза дает те же
+        copy-сегменты, что и N отдельных запусков, но одним процессом
+        и одним проходом по входному файлу.
+        """
+        if not segments:
+            return []
+
+        pattern = output_folder / f"temp_{video_path.stem}_part_%02d.mp4"
+        segment_times = ','.join(f"{end:.3f}" for _, end in segments)
+
+        # Только видео и аудио: -map 0 тянул бы и дорожки субтитров/данных
+        # из MKV, которые copy-муксер не может положить в mp4 - падал бы
+        # весь пакетный запуск
+        stream_maps = ['-map', '0:v:0', '-map', '0:a?']
+
+        cmd = self._ffmpeg_base() + [
             '-i', str(video_path),
-            '-ss', str(start_time),
-            '-t', str(end_time - start_time),
+        ] + stream_maps + [
             '-c', 'copy',
-            '-avoid_negative_ts', 'make_zero',
-            str(output_path),
-            '-y'  # Перезаписывать без вопросов
+            '-f', 'segment',
+            '-segment_times', segment_times,
+            '-reset_timestamps', '1',
+            '-segment_start_number', '1',
+            '-y',
+            str(pattern)
         ]
-        
+
         try:
             subprocess.run(cmd, check=True, capture_output=True)
-            return True
         except subprocess.CalledProcessError as e:
-            print(f"    Ошибка при создании сегмента: {e}")
-            return False
+            print(f"    Ошибка при пакетной нарезке: {e}")
+            # Запасной вариант: режем по одному сегменту на запуск -
+            # медленнее, но не зависит от segment-муксера
+            print(f"    Пробуем нарезать сегменты по одному...")
+            # Список обязан быть выровнен по индексам с segments:
+            # process_video берет temp_paths[i - 1]. Путь добавляется
+            # даже для упавшего сегмента - _process_segment сам
+            # пропустит отсутствующий файл
+            extracted = []
+            for i, (start, end) in enumerate(segments, 1):
+                part = output_folder / f"temp_{video_path.stem}_part_{i:02d}.mp4"
+                cmd_one = self._ffmpeg_base() + [
+                    '-ss', str(start),
+                    '-i', str(video_path),
+                    '-t', str(end - start),
+                ] + stream_maps + [
+                    '-c', 'copy',
+                    '-avoid_negative_ts', 'make_zero',
+                    '-y',
+                    str(part)
+                ]
+                try:
+                    subprocess.run(cmd_one, check=True, capture_output=True)
+                except subprocess.CalledProcessError as e_one:
+                    print(f"    Ошибка при нарезке сегмента {i}: {e_one}")
+                    part.unlink(missing_ok=True)
+                extracted.append(part)
+            return extracted
+
+        # Хвост за последним разрезом (короче min_duration) не нужен
+        tail = output_folder / f"temp_{video_path.stem}_part_{len(segments) + 1:02d}.mp4"
+        tail.unlink(missing_ok=True)
+
+        return [output_folder / f"temp_{video_path.stem}_part_{i:02d}.mp4"
+                for i in range(1, len(segments) + 1)]
     
-    def generate_subtitles(self, video_path: Path) -> str:
-        """Генерирует субтитры для видео используя Whisper"""
+    def _load_audio(self, video_path: Path):
+        """Декодирует аудиодорожку в float32 16kHz ОДИН раз на видео
+
+        Whisper при передаче пути запускает собственный ffmpeg-декод для
+        каждого сегмента. Один pipe-декод исходника и срезы массива по
+        времени сегмента экономят N-1 полных проходов по аудио.
+        """
+        cmd = self._ffmpeg_base() + [
+            '-i', str(video_path),
+            '-vn', '-sn',
+            '-f', 's16le', '-ac', '1', '-ar', str(AUDIO_SAMPLE_RATE),
+            '-'
+        ]
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, check=True)
+            return np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
+        except Exception as e:
+            print(f"  Не удалось декодировать аудио: {e}")
+            return None
+
+    def generate_subtitles(self, video_path: Path, audio=None) -> str:
+        """Генерирует субтитры для видео используя Whisper
+
+        audio - заранее декодированный float32-срез 16kHz из _load_audio;
+        если он передан, Whisper не декодирует файл заново.
+        """
         if not self.whisper_model:
             return ""
         
         try:
-            result = self.whisper_model.transcribe(str(video_path))
+            source = audio if audio is not None else str(video_path)
+            result = self.whisper_model.transcribe(source)
             
             # Формируем SRT субтитры
             srt_content = ""
@@ -247,11 +594,14 @@ class VideoShortsProcessor:
     def convert_to_mobile_format(self, input_path: Path, output_path: Path):
         """Конвертирует видео в мобильный формат 9:16 с размытым фоном"""
         try:
-            # Получаем информацию о видео
-            with VideoFileClip(str(input_path)) as clip:
-                original_width = clip.w
-                original_height = clip.h
-                original_ratio = original_width / original_height
+            # Получаем информацию о видео (без декодера moviepy)
+            info = self._probe(input_path)
+            original_width = info.get('width', 0)
+            original_height = info.get('height', 0)
+            if not original_width or not original_height:
+                print("     Не удалось определить разрешение видео")
+                return False
+            original_ratio = original_width / original_height
             
             print(f"     Конвертируем в мобильный формат...")
             print(f"     Исходное разрешение: {original_width}x{original_height} ({original_ratio:.2f}:1)")
@@ -284,8 +634,11 @@ class VideoShortsProcessor:
             # [0:v] - исходное видео
             # Делаем фон: масштабируем на всю высоту, размываем, центрируем
             # Делаем основное: масштабируем больше чем экран для лучшей видимости, накладываем поверх фона
+            # Фон сначала уменьшаем в 4 раза и только потом размываем:
+            # boxblur стоит O(площади), так что работы в ~16 раз меньше,
+            # а после растягивания обратно картинка все равно размыта
             filter_str = (
-                f"[0:v]scale={bg_scale_width}:{bg_scale_height},boxblur=15:3,crop={target_width}:{target_height}:{abs(bg_x) if bg_x < 0 else 0}:0[bg];"
+                f"[0:v]scale=iw/4:ih/4,boxblur=8:2,scale={bg_scale_width}:{bg_scale_height},crop={target_width}:{target_height}:{abs(bg_x) if bg_x < 0 else 0}:0[bg];"
                 f"[0:v]scale={main_scale_width}:{main_scale_height}[main];"
                 f"[bg][main]overlay={main_x}:{main_y}"
             )
@@ -293,17 +646,31 @@ class VideoShortsProcessor:
             print(f"     Применяем фильтр размытого фона...")
             
             # Выполняем конвертацию
-            cmd = [
-                'ffmpeg',
+            cmd = self._ffmpeg_base() + [
                 '-i', str(input_path.absolute()),
                 '-filter_complex', filter_str,
+            ] + self._h264_encode_args(self.caps.h264_encoder) + [
                 '-c:a', 'copy',
                 '-y',
                 str(output_path.absolute())
             ]
             
             result = subprocess.run(cmd, capture_output=True, text=True)
-            
+
+            if result.returncode != 0 and self.caps.h264_encoder != 'libx264':
+                # Аппаратный энкодер может отвалиться (нет GPU в контейнере,
+                # занятые сессии NVENC) - повторяем на libx264
+                print(f"     {self.caps.h264_encoder} не сработал, повторяем на libx264...")
+                cmd = self._ffmpeg_base() + [
+                    '-i', str(input_path.absolute()),
+                    '-filter_complex', filter_str,
+                ] + self._h264_encode_args('libx264') + [
+                    '-c:a', 'copy',
+                    '-y',
+                    str(output_path.absolute())
+                ]
+                result = subprocess.run(cmd, capture_output=True, text=True)
+
             if result.returncode == 0:
                 print(f"     Мобильная версия создана с размытым фоном!")
                 return True
@@ -320,87 +687,112 @@ class VideoShortsProcessor:
             print(f"     Ошибка при конвертации в мобильный формат: {e}")
             return False
 
-    def add_subtitles_with_drawtext(self, video_path: Path, srt_content: str, output_path: Path):
-        """Альтернативный способ - используем drawtext для каждой строки субтитров"""
+    @staticmethod
+    def _seconds_to_ass_time(seconds: float) -> str:
+        """Конвертирует секунды в формат времени ASS (Ч:ММ:СС.сс)"""
+        hours = int(seconds // 3600)
+        minutes = int((seconds % 3600) // 60)
+        secs = seconds % 60
+        return f"{hours}:{minutes:02d}:{secs:05.2f}"
+
+    def add_subtitles_with_ass(self, video_path: Path, srt_content: str, output_path: Path):
+        """Альтернативный способ - рендерим все субтитры одним ass-фильтром
+
+        Раньше здесь строилась цепочка из N drawtext-фильтров: каждый
+        drawtext копирует кадр даже при enable=0, так что стоимость
+        кадра росла как O(всех реплик), а не O(видимых). libass рисует
+        все реплики за один проход по кадру и корректно работает с
+        UTF-8 и кернингом.
+        """
+        ass_path = output_path.parent / f"temp_{output_path.stem}.ass"
+
         try:
             # Парсим SRT контент
             subtitle_entries = self.parse_srt_content(srt_content)
-            
+
             if not subtitle_entries:
-                print("     Не удалось распарсить субтитры для drawtext")
+                print("     Не удалось распарсить субтитры для ass")
                 return False
-            
-            print(f"     Используем drawtext для {len(subtitle_entries)} фрагментов субтитров")
-            
-            # Создаем фильтр drawtext для каждого субтитра
-            drawtext_filters = []
+
+            print(f"     Рендерим {len(subtitle_entries)} фрагментов субтитров одним ass-фильтром")
+
+            # Минимальный ASS: стиль повторяет прежний drawtext
+            # (белый текст на полупрозрачной черной подложке снизу)
+            ass_lines = [
+                '[Script Info]',
+                'ScriptType: v4.00+',
+                '',
+                '[V4+ Styles]',
+                'Format: Name, Fontname, Fontsize, PrimaryColour, OutlineColour, BackColour, '
+                'Bold, BorderStyle, Outline, Shadow, Alignment, MarginV',
+                'Style: Default,Arial,28,&H00FFFFFF,&H00000000,&HB3000000,0,3,6,0,2,30',
+                '',
+                '[Events]',
+                'Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text',
+            ]
             for entry in subtitle_entries:
-                start_sec = entry['start']
-                end_sec = entry['end'] 
-                text = entry['text'].replace("'", "\\'").replace(":", "\\:")
-                
-                # Создаем фильтр для этого времени - ОПТИМАЛЬНЫЙ РАЗМЕР
-                filter_str = f"drawtext=fontfile=C\\\\:/Windows/Fonts/arial.ttf:text='{text}':fontcolor=white:fontsize=28:box=1:boxcolor=black@0.7:boxborderw=6:x=(w-text_w)/2:y=h-th-30:enable='between(t,{start_sec},{end_sec})'"
-                drawtext_filters.append(filter_str)
-            
-            # Объединяем все фильтры
-            combined_filter = ','.join(drawtext_filters)
-            
+                text = entry['text'].replace('\n', '\\N')
+                ass_lines.append(
+                    f"Dialogue: 0,{self._seconds_to_ass_time(entry['start'])},"
+                    f"{self._seconds_to_ass_time(entry['end'])},Default,,0,0,0,,{text}"
+                )
+
+            with open(ass_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(ass_lines))
+
             # Выполняем команду
             video_path_str = str(video_path.absolute())
             output_path_str = str(output_path.absolute())
-            
-            cmd = [
-                'ffmpeg',
+
+            cmd = self._ffmpeg_base() + [
                 '-i', video_path_str,
-                '-vf', combined_filter,
+                '-vf', f"ass='{self._filter_file_arg(ass_path)}'",
                 '-c:a', 'copy',
                 '-y',
                 output_path_str
             ]
-            
-            print(f"     Способ 2: Используем drawtext...")
+
+            print(f"     Способ 2: Используем ass-фильтр...")
             result = subprocess.run(cmd, capture_output=True, text=True)
             
             if result.returncode == 0:
-                print(f"     Субтитры встроены через drawtext!")
+                print(f"     Субтитры встроены через ass!")
                 return True
             else:
-                print(f"     Drawtext тоже не сработал")
+                print(f"     Ass-фильтр тоже не сработал")
                 return False
                 
         except Exception as e:
-            print(f"     Ошибка в drawtext методе: {e}")
+            print(f"     Ошибка в ass методе: {e}")
             return False
+        finally:
+            ass_path.unlink(missing_ok=True)
     
     def parse_srt_content(self, srt_content: str) -> List[dict]:
-        """Парсит SRT контент в список словарей с временными метками"""
+        """Парсит SRT контент в список словарей с временными метками
+
+        Все блоки находит один скомпилированный regex, а временные поля
+        конвертируются в секунды одной матричной операцией NumPy - при
+        тысячах реплик Whisper это убирает питоновский разбор строк
+        с горячего пути.
+        """
+        matches = _SRT_BLOCK_RE.findall(srt_content.strip())
+        if not matches:
+            return []
+
+        # Колонки 1-8 каждого блока: ЧЧ/ММ/СС/мс начала и конца
+        times = np.array([m[1:9] for m in matches], dtype=np.float64)
+        starts = times[:, :4] @ _SRT_TIME_WEIGHTS
+        ends = times[:, 4:] @ _SRT_TIME_WEIGHTS
+
         entries = []
-        blocks = srt_content.strip().split('\n\n')
-        
-        for block in blocks:
-            lines = block.strip().split('\n')
-            if len(lines) >= 3:
-                try:
-                    # Парсим строку времени (например: 00:00:01,500 --> 00:00:05,000)
-                    time_line = lines[1]
-                    if ' --> ' in time_line:
-                        start_str, end_str = time_line.split(' --> ')
-                        start_sec = self.srt_time_to_seconds(start_str.strip())
-                        end_sec = self.srt_time_to_seconds(end_str.strip())
-                        
-                        # Объединяем текстовые строки
-                        text = ' '.join(lines[2:])
-                        
-                        entries.append({
-                            'start': start_sec,
-                            'end': end_sec,
-                            'text': text
-                        })
-                except Exception as e:
-                    print(f"     Ошибка парсинга блока: {e}")
-                    continue
-        
+        for m, start_sec, end_sec in zip(matches, starts, ends):
+            entries.append({
+                'start': float(start_sec),
+                'end': float(end_sec),
+                'text': ' '.join(m[9].strip().split('\n'))
+            })
+
         return entries
     
     def srt_time_to_seconds(self, time_str: str) -> float:
@@ -423,6 +815,14 @@ class VideoShortsProcessor:
             import shutil
             shutil.copy2(video_path, output_path)
             return True
+
+        # Все три способа опираются на libass (фильтры subtitles/ass) -
+        # без него не тратим три заведомо провальных запуска FFmpeg
+        if not self.caps.has_libass:
+            print("     FFmpeg собран без libass, сохраняем видео без субтитров")
+            import shutil
+            shutil.copy2(video_path, output_path)
+            return True
         
         # Сохраняем субтитры во временный файл
         srt_path = output_path.parent / f"temp_{output_path.stem}.srt"
@@ -445,8 +845,7 @@ class VideoShortsProcessor:
             srt_path_str = str(srt_path.absolute()).replace('\\', '/')
             
             # СПОСОБ 1: Используем subtitles фильтр с прямым путем к шрифту
-            cmd1 = [
-                'ffmpeg',
+            cmd1 = self._ffmpeg_base() + [
                 '-i', video_path_str,
                 '-vf', f"subtitles={srt_path_str}:fontfile=C\\:/Windows/Fonts/arial.ttf:fontsize=24:fontcolor=white:outline=1:outlinecolor=black",
                 '-c:a', 'copy',
@@ -463,15 +862,14 @@ class VideoShortsProcessor:
                 print(f"    ✅ Субтитры успешно встроены!")
                 return True
             else:
-                print(f"    ⚠️ Способ 1 не сработал, пробуем drawtext...")
+                print(f"    ⚠️ Способ 1 не сработал, пробуем ass...")
                 
-                # СПОСОБ 2: Используем drawtext - парсим SRT и накладываем каждую строку
-                if self.add_subtitles_with_drawtext(video_path, srt_content, output_path):
+                # СПОСОБ 2: Конвертируем SRT в ASS и рендерим одним фильтром
+                if self.add_subtitles_with_ass(video_path, srt_content, output_path):
                     return True
                 
                 # СПОСОБ 3: Упрощенные субтитры без шрифта
-                cmd3 = [
-                    'ffmpeg',
+                cmd3 = self._ffmpeg_base() + [
                     '-i', video_path_str,
                     '-vf', f"subtitles={srt_path_str}",
                     '-c:a', 'copy',
@@ -526,57 +924,88 @@ class VideoShortsProcessor:
         video_output_folder = self.output_folder / video_path.stem
         video_output_folder.mkdir(exist_ok=True)
         
-        successful_segments = 0
-        
-        # Обрабатываем каждый сегмент
+        # Нарезаем все сегменты одним процессом FFmpeg
+        temp_paths = self.extract_segments(video_path, segments, video_output_folder)
+
+        # Аудио для Whisper декодируем один раз на исходник -
+        # сегментам достаются срезы массива по их времени
+        source_audio = self._load_audio(video_path) if self.whisper_model else None
+
+        # Готовим задания и конвертируем сегменты параллельно: каждый -
+        # независимый вызов FFmpeg, GIL на subprocess не влияет
+        jobs = []
         for i, (start, end) in enumerate(segments, 1):
             duration = end - start
             segment_name = f"{video_path.stem}_part_{i:02d}_({duration:.0f}s).mp4"
-            temp_segment_path = video_output_folder / f"temp_{segment_name}"
+            temp_segment_path = temp_paths[i - 1] if temp_paths else None
             final_segment_path = video_output_folder / segment_name
-            
-            print(f"    Сегмент {i}/{len(segments)}: {start:.1f}s - {end:.1f}s ({duration:.1f}s)")
-            
-            # Извлекаем сегмент
-            if self.extract_segment(video_path, start, end, temp_segment_path):
-                print(f"    Видео сегмент извлечен")
-                
-                if temp_segment_path.exists():
-                    # ВРЕМЕННО ОТКЛЮЧЕНЫ СУБТИТРЫ - только мобильная конвертация
-                    print(f"    Создаем мобильную версию...")
-                    
-                    if self.convert_to_mobile_format(temp_segment_path, final_segment_path):
-                        print(f"    {segment_name} готов (мобильная версия)!")
-                        successful_segments += 1
-                    else:
-                        # Если мобильная версия не создалась, оставляем оригинальную
-                        temp_segment_path.rename(final_segment_path)
-                        print(f"    {segment_name} готов (оригинальная версия)")
-                        successful_segments += 1
-                    
-                    # Удаляем временный файл
-                    if temp_segment_path.exists():
-                        temp_segment_path.unlink()
-                else:
-                    print(f"    Временный файл сегмента не найден")
-            else:
-                print(f"    Не удалось создать сегмент {i}")
-        
+            audio_slice = None
+            if source_audio is not None:
+                audio_slice = source_audio[int(start * AUDIO_SAMPLE_RATE):int(end * AUDIO_SAMPLE_RATE)]
+            jobs.append((i, len(segments), start, end, segment_name,
+                         temp_segment_path, final_segment_path, audio_slice))
+
+        workers = min(4, len(jobs))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda job: self._process_segment(*job), jobs))
+        else:
+            results = [self._process_segment(*job) for job in jobs]
+
+        successful_segments = sum(1 for ok in results if ok)
+
         print(f"  Успешно создано сегментов: {successful_segments}/{len(segments)}")
+
+    def _process_segment(self, i: int, total: int, start: float, end: float,
+                         segment_name: str, temp_segment_path, final_segment_path: Path,
+                         audio_slice=None) -> bool:
+        """Доводит один извлеченный сегмент до готового шортса"""
+        duration = end - start
+        print(f"    Сегмент {i}/{total}: {start:.1f}s - {end:.1f}s ({duration:.1f}s)")
+
+        if temp_segment_path is None or not temp_segment_path.exists():
+            print(f"    Не удалось создать сегмент {i}")
+            return False
+
+        print(f"    Видео сегмент извлечен")
+
+        # Субтитры по готовому аудио-срезу (модель по умолчанию отключена)
+        srt_content = ""
+        if self.whisper_model:
+            print(f"    Генерируем субтитры...")
+            srt_content = self.generate_subtitles(temp_segment_path, audio=audio_slice)
+
+        print(f"    Создаем мобильную версию...")
+
+        if self.convert_to_mobile_format(temp_segment_path, final_segment_path):
+            if srt_content:
+                subtitled_path = final_segment_path.with_name(f"subs_{final_segment_path.name}")
+                if self.add_subtitles_to_video(final_segment_path, srt_content, subtitled_path):
+                    final_segment_path.unlink(missing_ok=True)
+                    subtitled_path.rename(final_segment_path)
+            print(f"    {segment_name} готов (мобильная версия)!")
+        else:
+            # Если мобильная версия не создалась, оставляем оригинальную
+            temp_segment_path.rename(final_segment_path)
+            print(f"    {segment_name} готов (оригинальная версия)")
+
+        # Удаляем временный файл
+        if temp_segment_path.exists():
+            temp_segment_path.unlink()
+
+        return True
     
     def run(self):
         """Основной метод запуска обработки"""
         print("Запуск автоматического процессора видео для шортсов")
         print("=" * 60)
         
-        # Проверяем наличие FFmpeg
-        try:
-            result = subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True, text=True)
+        # Проверяем наличие FFmpeg (по стартовому опросу возможностей)
+        if self.caps.available:
             print("FFmpeg найден")
             # Показываем версию для диагностики
-            version_line = result.stdout.split('\n')[0] if result.stdout else "версия неизвестна"
-            print(f"    {version_line}")
-        except (subprocess.CalledProcessError, FileNotFoundError):
+            print(f"    {self.caps.version_line or 'версия неизвестна'}")
+        else:
             print(" FFmpeg не найден! Установите FFmpeg и добавьте в PATH")
             print("    Для корректной работы субтитров нужна полная версия FFmpeg")
             print("    Инструкции: https://ffmpeg.org/download.html")
@@ -609,15 +1038,25 @@ class VideoShortsProcessor:
         print(f"    Максимальная длительность сегмента: {self.max_duration} сек")
         print(f"    Субтитры: {' включены (Whisper)' if self.whisper_model else ' отключены'}")
         
-        # Обрабатываем каждое видео
+        # Обрабатываем видео параллельно: пайплайны FFmpeg по разным
+        # файлам независимы, каждому воркеру оставляем ~4 ядра под
+        # внутренние потоки самого FFmpeg
+        workers = max(1, self.caps.nproc // 4)
         total_processed = 0
-        for video_path in video_files:
-            try:
-                self.process_video(video_path)
-                total_processed += 1
-            except Exception as e:
-                print(f" Ошибка при обработке {video_path.name}: {e}")
-                continue
+
+        if workers > 1 and len(video_files) > 1:
+            print(f"\n Параллельная обработка: {workers} процесс(а)")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_process_one, [str(p) for p in video_files]))
+            total_processed = sum(1 for ok in results if ok)
+        else:
+            for video_path in video_files:
+                try:
+                    self.process_video(video_path)
+                    total_processed += 1
+                except Exception as e:
+                    print(f" Ошибка при обработке {video_path.name}: {e}")
+                    continue
         
         print("\n" + "=" * 60)
         print(f" Обработка завершена!")
@@ -626,6 +1065,21 @@ class VideoShortsProcessor:
         print("\n Готовые шортсы можно найти в папке 'output_shorts'")
 
 
+def _process_one(video_path_str: str) -> bool:
+    """Обрабатывает одно видео в отдельном процессе пула
+
+    Создает собственный процессор: сам объект класса не пиклится
+    (модель Whisper не сериализуется), а пересоздать его дешево.
+    """
+    try:
+        processor = VideoShortsProcessor()
+        processor.process_video(Path(video_path_str))
+        return True
+    except Exception as e:
+        print(f" Ошибка при обработке {Path(video_path_str).name}: {e}")
+        return False
+
+
 def main():
     """Главная функция"""
     processor = VideoShortsProcessor()